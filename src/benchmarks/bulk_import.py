@@ -0,0 +1,78 @@
+"""
+Import Throughput
+
+Parses and checks a generated import of goals as CSV, JSON and JSON Lines, then with `--postgres` loads it into the
+database configured by the `DB_*` environment variables with one COPY and, for comparison, with one `Goal.create` per
+row for a sample of it. Run from the `src` directory against a disposable database with the bot's schema:
+    python -m benchmarks.bulk_import [--rows 10000] [--postgres] [--sample 500]
+"""
+import argparse
+import asyncio
+import csv
+import io
+import json
+from time import perf_counter
+
+from dotenv import load_dotenv
+
+from commands.bulk_import import check_goal_row, parse_import
+from models.goal import Goal
+from utils.database import database as db
+
+
+USER_ID = 3_000_000
+
+
+def generate(rows: int) -> dict[str, bytes]:
+    """:returns The same goals as a file of each format, keyed by file name"""
+    goals = [{"text": f"Imported goal {i}", "reward": 1 + i % 99, "repeat": ("never", "daily", "2")[i % 3]}
+             for i in range(rows)]
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=["text", "reward", "repeat"])
+    writer.writeheader()
+    writer.writerows(goals)
+    return {
+        "import.csv": out.getvalue().encode(),
+        "import.json": json.dumps(goals).encode(),
+        "import.jsonl": "\n".join(json.dumps(g) for g in goals).encode(),
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--postgres", action="store_true", help="Also load the import into the DB_* database")
+    parser.add_argument("--sample", type=int, default=500, help="Rows inserted one at a time for comparison")
+    args = parser.parse_args()
+
+    goals = []
+    for filename, data in generate(args.rows).items():
+        start = perf_counter()
+        goals, errors = parse_import(data, filename, USER_ID, check_goal_row)
+        elapsed = perf_counter() - start
+        assert not errors, errors[:5]
+        print(f"parse {filename:<13}{len(data) / 1024:>8.0f}KB {elapsed * 1000:>9.1f}ms {len(goals) / elapsed:>10.0f} rows/s")
+
+    if not args.postgres:
+        return
+
+    load_dotenv()
+    await db.connect()
+    try:
+        start = perf_counter()
+        await Goal.create_many(USER_ID, goals)
+        elapsed = perf_counter() - start
+        print(f"COPY             {len(goals):>8} rows {elapsed * 1000:>9.1f}ms {len(goals) / elapsed:>10.0f} rows/s")
+
+        sample = goals[:args.sample]
+        start = perf_counter()
+        for g in sample:
+            await g.create()
+        elapsed = perf_counter() - start
+        print(f"Goal.create      {len(sample):>8} rows {elapsed * 1000:>9.1f}ms {len(sample) / elapsed:>10.0f} rows/s")
+    finally:
+        await db.execute("DELETE FROM goal WHERE discord_user=$1;", USER_ID)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
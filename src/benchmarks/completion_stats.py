@@ -0,0 +1,106 @@
+"""
+Completion Stats, Kept Up To Date Or Computed From The History
+
+Applies the migrations to the database configured by the `DB_*` environment variables, seeds it with millions of
+completions if it has none, and rebuilds the stats from them with the backfill. It then compares, for a sample of
+users:
+- what `/stats` reads, the kept totals and the current day, week and month
+- the same stats computed from the user's completions
+and the cost of completing a goal with the statement that keeps them against the update that only marked it completed.
+Run from the `src` directory against a disposable database:
+    python -m benchmarks.completion_stats [--users 50000] [--goals 500000] [--completions 5000000]
+"""
+import argparse
+import asyncio
+from datetime import datetime, timedelta, UTC
+from time import perf_counter
+
+from dotenv import load_dotenv
+
+from models.goal import COMPLETE_GOAL, UPDATE_GOAL
+from models.stats import PERIODS, UserStats, backfill, period_starts
+from utils.database import database as db
+from utils.migrations import migrate
+
+
+# Completions are spread over two years, each user completes on most days so streaks are long
+SEED = """
+    INSERT INTO discord_user (id, points, share_points)
+    SELECT i, 0, 0 FROM generate_series(1, {users}) AS i ON CONFLICT DO NOTHING;
+
+    INSERT INTO goal (discord_user, text, reward, repeat)
+    SELECT i % {users} + 1, 'Goal ' || i, 10, 1 FROM generate_series(1, {goals}) AS i;
+
+    INSERT INTO goal_completion (goal, discord_user, crumbs, completed)
+    SELECT g.id, g.discord_user, 10, now() - make_interval(days => (i / {goals}) % 730, secs => i % 86400)
+    FROM generate_series(1, {completions}) AS i
+    JOIN goal g ON g.id = (SELECT min(id) FROM goal) + i % {goals};
+"""
+
+# What the kept stats answer, computed from the user's completions
+HISTORY_STATS = """
+    WITH c AS (
+        SELECT (completed AT TIME ZONE $2)::date AS day, crumbs FROM goal_completion WHERE discord_user=$1
+    ), runs AS (
+        SELECT count(*) AS length, max(day) AS last_day FROM (
+            SELECT day, day - (row_number() OVER (ORDER BY day))::int AS island FROM (SELECT DISTINCT day FROM c) d
+        ) islands GROUP BY island
+    )
+    SELECT (SELECT count(*) FROM c) AS completions, (SELECT sum(crumbs) FROM c) AS crumbs,
+           (SELECT max(length) FROM runs) AS best_streak,
+           (SELECT length FROM runs ORDER BY last_day DESC LIMIT 1) AS current_streak,
+           (SELECT count(*) FROM c WHERE day = $3) AS today,
+           (SELECT count(*) FROM c WHERE day >= $4) AS week,
+           (SELECT count(*) FROM c WHERE day >= $5) AS month;
+"""
+
+
+async def mean_ms(calls) -> float:
+    start = perf_counter()
+    for call in calls:
+        await call()
+    return (perf_counter() - start) / len(calls) * 1000
+
+
+async def main(users: int, goals: int, completions: int) -> None:
+    await migrate()
+    await db.connect()
+    if not await db.fetchval("SELECT EXISTS(SELECT 1 FROM goal_completion);"):
+        print(f"Seeding {completions} completions of {goals} goals for {users} users")
+        start = perf_counter()
+        await db.execute(SEED.format(users=users, goals=goals, completions=completions))
+        await db.execute("VACUUM ANALYZE;")
+        print(f"seeded       {perf_counter() - start:>8.2f}s")
+
+    total = await db.fetchval("SELECT count(*) FROM goal_completion;")
+    start = perf_counter()
+    await backfill()
+    print(f"backfill     {perf_counter() - start:>8.2f}s for {total} completions")
+
+    today = datetime.now(UTC).date()
+    starts = period_starts(today)
+    sample = list(range(1, users + 1, max(users // 500, 1)))
+    kept = await mean_ms([lambda u=u: UserStats.fetch(u, UTC) for u in sample])
+    history = await mean_ms([lambda u=u: db.fetch_one(HISTORY_STATS, u, "UTC", *starts) for u in sample])
+    print(f"/stats read  kept {kept:.3f}ms, from history {history:.3f}ms")
+
+    goal_ids = await db.fetch("SELECT id FROM goal WHERE completed_at IS NULL ORDER BY id LIMIT $1;", 2 * len(sample))
+    now = datetime.now(UTC)
+    reset_at = now + timedelta(days=1)
+    half = len(goal_ids) // 2
+    plain = await mean_ms([lambda r=r: db.execute(UPDATE_GOAL, r["id"], now, "Goal", 10, 1, reset_at)
+                           for r in goal_ids[:half]])
+    keeping = await mean_ms([lambda r=r: db.fetch_one(COMPLETE_GOAL, r["id"], now, reset_at, 10.0, 1, today,
+                                                      list(PERIODS), starts, reset_at + timedelta(days=1))
+                             for r in goal_ids[half:]])
+    print(f"complete     marked only {plain:.3f}ms, keeping stats {keeping:.3f}ms")
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=50_000)
+    parser.add_argument("--goals", type=int, default=500_000)
+    parser.add_argument("--completions", type=int, default=5_000_000)
+    args = parser.parse_args()
+    asyncio.run(main(args.users, args.goals, args.completions))
@@ -0,0 +1,110 @@
+"""
+Lightweight Stand Ins For The Parts Of `Interaction` And `ApplicationContext` The Handlers Use
+
+Responses are serialised with `to_components` like pycord would before sending them, then thrown away.
+"""
+import asyncio
+from itertools import count
+
+
+_ids = count(1)
+
+
+class FakeUser:
+    def __init__(self, user_id: int, display_name: str = "Benchmark Cat"):
+        self.id = user_id
+        self.display_name = display_name
+        self.name = display_name
+
+
+class FakeComponent:
+    def __init__(self, component_id: int | None):
+        self.id = component_id
+
+
+class FakeMessage:
+    def __init__(self, components: dict[str, int | None] = None):
+        self.id = next(_ids)
+        # Key: Custom ID, Value: Component ID
+        self.components = components or {}
+
+    def get_component(self, custom_id: str) -> FakeComponent | None:
+        if custom_id not in self.components:
+            return None
+        return FakeComponent(self.components[custom_id])
+
+
+def _serialise(view) -> None:
+    if hasattr(view, "to_components"):
+        view.to_components()
+    elif hasattr(view, "to_component_dict"):
+        view.to_component_dict()
+
+
+class FakeResponse:
+    def __init__(self, interaction: "FakeInteraction"):
+        self.interaction = interaction
+        self.done = False
+
+    def is_done(self) -> bool:
+        return self.done
+
+    async def defer(self, *args, **kwargs) -> None:
+        # Every response is a request to Discord, which lets other handlers run
+        await asyncio.sleep(0)
+        self.done = True
+
+    async def edit_message(self, *args, view=None, **kwargs) -> None:
+        await asyncio.sleep(0)
+        _serialise(view)
+        self.done = True
+        self.interaction.edits += 1
+
+
+class FakeInteraction:
+    def __init__(self, user: FakeUser, custom_id: str | None = None, message: FakeMessage | None = None):
+        self.id = next(_ids)
+        self.token = f"token-{self.id}"
+        self.user = user
+        self.custom_id = custom_id
+        self.message = message
+        self.data = {"custom_id": custom_id} if custom_id else {}
+        self.response = FakeResponse(self)
+        self.responses = 0
+        self.edits = 0
+
+    async def respond(self, *args, view=None, **kwargs) -> None:
+        _serialise(view)
+        self.responses += 1
+
+    async def edit(self, *args, view=None, **kwargs) -> None:
+        _serialise(view)
+        self.edits += 1
+
+    async def edit_original_response(self, *args, view=None, **kwargs) -> None:
+        await asyncio.sleep(0)
+        _serialise(view)
+        self.edits += 1
+
+
+class FakeBot:
+    def get_command(self, *args, **kwargs):
+        return FakeCommand()
+
+
+class FakeCommand:
+    mention = "</goal:0>"
+
+
+class FakeContext:
+    def __init__(self, user: FakeUser):
+        self.author = user
+        self.user = user
+        self.bot = FakeBot()
+        self.interaction = FakeInteraction(user)
+
+    async def respond(self, *args, view=None, **kwargs) -> None:
+        await self.interaction.respond(view=view)
+
+    async def send_modal(self, modal) -> None:
+        pass
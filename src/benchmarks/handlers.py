@@ -0,0 +1,225 @@
+"""
+End To End Benchmarks Of The Interaction Handlers Without A Discord Gateway
+
+Run from the `src` directory:
+    python -m benchmarks.handlers [--iterations 500] [--latency-ms 0] [--postgres] [--output results.json]
+                                  [--compare baseline.json] [--tolerance 0.1]
+
+By default the handlers run against `benchmarks.memory_db.MemoryDatabase`. With `--postgres` they run against the
+database configured by the `DB_*` environment variables, which must have the bot's schema and should be disposable.
+The memory database skips asyncpg, so also run `python -m benchmarks.plan_check --smoke` against Postgres, which runs
+every registered statement, not only the ones these handlers use, through the real pool.
+Each handler reports throughput, p50/p99 latency and database round trips per operation. `--output` saves the results
+as JSON and `--compare` checks them against an earlier file, exiting with 1 if any handler regressed.
+"""
+import argparse
+import asyncio
+import json
+import sys
+from collections.abc import Awaitable, Callable
+from datetime import datetime, UTC
+from statistics import quantiles
+from time import perf_counter
+
+from dotenv import load_dotenv
+
+from benchmarks.fakes import FakeContext, FakeInteraction, FakeMessage, FakeUser
+from benchmarks.memory_db import MemoryDatabase
+from commands.create_goal import CreateGoal, add_incentive_button, complete_goal_button
+from commands.shop import shop, shop_reward_button
+from commands.view_goals import PAGE_SIZE, goal_list, goal_page_button
+from models.goal import Goal, RepeatType
+from models.reward import Reward
+from models.user import User
+from utils.cache import ModelCache
+from utils.database import database
+from utils.pagination import PageCursor
+
+
+OWNER_ID = 1
+FRIEND_BASE_ID = 1_000_000
+LIST_SIZE = 30
+# Clicks on ▶️ that arrive together, like a user hammering it
+NAV_BURST = 5
+
+
+class RoundTripCounter:
+    """Counts calls to the query helpers of a real `Database`"""
+
+    def __init__(self, target):
+        self.round_trips = 0
+        for name in ("execute", "fetch", "fetch_one", "fetchval"):
+            setattr(target, name, self._wrap(getattr(target, name)))
+
+    def _wrap(self, method):
+        async def counted(*args, **kwargs):
+            self.round_trips += 1
+            return await method(*args, **kwargs)
+        return counted
+
+
+class World:
+    def __init__(self, iterations: int):
+        self.iterations = iterations
+        self.owner = FakeUser(OWNER_ID)
+        self.goals: list[int] = []
+        self.rewards: list[int] = []
+
+    async def populate(self) -> None:
+        owner = await User.fetch(OWNER_ID)
+        await owner.add_points(10 ** 9, 0, reason="benchmark")
+        for i in range(LIST_SIZE):
+            g = Goal(OWNER_ID, f"Benchmark goal {i}", RepeatType(i % 5), 5)
+            await g.create()
+            self.goals.append(g.id)
+            r = Reward(OWNER_ID, f"Benchmark reward {i}", 10, True)
+            await r.create()
+            self.rewards.append(r.id)
+        # Every nibble needs a different sender
+        for i in range(self.iterations):
+            friend = await User.fetch(FRIEND_BASE_ID + i)
+            await friend.add_points(0, 1, reason="benchmark")
+
+
+def bench_create_goal(world: World, i: int) -> Awaitable:
+    interaction = FakeInteraction(world.owner)
+    modal = CreateGoal()
+    modal.goal_text.refresh_state({"value": f"Created goal {i}"})
+    modal.repeat_select.refresh_from_modal(interaction, {"values": [str(i % 5)]})
+    modal.crumb_count.refresh_state({"value": "5"})
+    return modal.callback(interaction)
+
+
+def bench_complete_goal(world: World, i: int) -> Awaitable:
+    goal_id = world.goals[i % len(world.goals)]
+    return complete_goal_button(FakeInteraction(world.owner, "complete_goal", FakeMessage({"complete_goal": goal_id})))
+
+
+def bench_add_incentive(world: World, i: int) -> Awaitable:
+    goal_id = world.goals[i % len(world.goals)]
+    friend = FakeUser(FRIEND_BASE_ID + i)
+    return add_incentive_button(FakeInteraction(friend, "add_incentive", FakeMessage({"complete_goal": goal_id})))
+
+
+def bench_goal_list(world: World, i: int) -> Awaitable:
+    return goal_list.callback(FakeContext(world.owner), True)
+
+
+async def bench_goal_list_nav(world: World, i: int) -> None:
+    goals = await Goal.fetch_user_goals_page(OWNER_ID, True, limit=PAGE_SIZE)
+    forward = PageCursor("goal_page", OWNER_ID, 1, 1, LIST_SIZE // PAGE_SIZE, True, (goals[-1].created, goals[-1].id))
+    message = FakeMessage()
+    await asyncio.gather(*(goal_page_button(FakeInteraction(world.owner, forward.custom_id, message))
+                           for _ in range(NAV_BURST)))
+
+
+def bench_shop(world: World, i: int) -> Awaitable:
+    return shop.callback(FakeContext(world.owner))
+
+
+def bench_shop_reward(world: World, i: int) -> Awaitable:
+    # Renewable rewards only, redeeming a one time reward rebuilds the view from a real message
+    reward_id = world.rewards[i % len(world.rewards)]
+    return shop_reward_button(FakeInteraction(world.owner, f"shop_reward::{reward_id}"))
+
+
+BENCHMARKS: dict[str, Callable[[World, int], Awaitable]] = {
+    "create_goal": bench_create_goal,
+    "complete_goal": bench_complete_goal,
+    "add_incentive": bench_add_incentive,
+    "goal_list": bench_goal_list,
+    "goal_list_nav": bench_goal_list_nav,
+    "shop": bench_shop,
+    "shop_reward": bench_shop_reward,
+}
+
+
+async def run(iterations: int, counter, cold: bool) -> dict[str, dict[str, float]]:
+    world = World(iterations)
+    await world.populate()
+
+    results = {}
+    for name, bench in BENCHMARKS.items():
+        samples = []
+        round_trips = 0
+        for i in range(iterations):
+            if cold:
+                for cache in ModelCache._registry.values():
+                    cache.clear()
+            operation = bench(world, i)
+            before = counter.round_trips
+            start = perf_counter()
+            await operation
+            samples.append(perf_counter() - start)
+            round_trips += counter.round_trips - before
+
+        cuts = quantiles(samples, n=100, method="inclusive")
+        results[name] = {
+            "iterations": iterations,
+            "ops_per_sec": iterations / sum(samples),
+            "p50_ms": cuts[49] * 1000,
+            "p99_ms": cuts[98] * 1000,
+            "round_trips_per_op": round_trips / iterations,
+        }
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    regressions = []
+    for name, r in results.items():
+        old = baseline.get(name)
+        if old is None:
+            continue
+        for metric in ("p50_ms", "p99_ms", "round_trips_per_op"):
+            if old[metric] and r[metric] > old[metric] * (1 + tolerance):
+                regressions.append(f"{name}: {metric} {old[metric]:.3f} -> {r[metric]:.3f}")
+    return regressions
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the interaction handlers offline")
+    parser.add_argument("--iterations", type=int, default=500)
+    parser.add_argument("--latency-ms", type=float, default=0, help="Simulated latency per round trip (memory db)")
+    parser.add_argument("--postgres", action="store_true", help="Use the database from the DB_* variables")
+    parser.add_argument("--cold", action="store_true", help="Clear the model caches before every operation")
+    parser.add_argument("--output", help="Save the results as JSON")
+    parser.add_argument("--compare", help="Results JSON from an earlier run to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Allowed relative slowdown when comparing")
+    args = parser.parse_args()
+
+    if args.postgres:
+        load_dotenv()
+        counter = RoundTripCounter(database)
+    else:
+        counter = MemoryDatabase(latency=args.latency_ms / 1000)
+        counter.install(database)
+
+    results = await run(args.iterations, counter, args.cold)
+
+    print(f"{'handler':<15}{'ops/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'trips/op':>10}")
+    for name, r in results.items():
+        print(f"{name:<15}{r['ops_per_sec']:>10.0f}{r['p50_ms']:>10.3f}{r['p99_ms']:>10.3f}"
+              f"{r['round_trips_per_op']:>10.2f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "created": datetime.now(UTC).isoformat(),
+                "backend": "postgres" if args.postgres else "memory",
+                "latency_ms": args.latency_ms,
+                "cold": args.cold,
+                "results": results,
+            }, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.tolerance)
+        for line in regressions:
+            print("REGRESSION " + line)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,262 @@
+"""
+An In Process Stand In For `utils.database.Database`
+
+Only the registered statements the benchmarked handlers run are implemented, each by a method named after the
+statement. Every call counts as one round trip and can be given an artificial latency so round trips cost something.
+
+It replaces the query helpers, so nothing run against it goes through asyncpg or the pool. Cover that path against
+Postgres with `python -m benchmarks.plan_check --smoke`, which runs every registered statement through the real pool.
+"""
+import asyncio
+from collections.abc import Callable
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, UTC
+from itertools import count
+
+from models.incentive import MAX_SENDERS
+from utils.database import Database, Statement
+
+
+class MemoryDatabase:
+    def __init__(self, latency: float = 0):
+        self.latency = latency
+        self.round_trips = 0
+
+        self.users: dict[int, dict] = {}
+        self.goals: dict[int, dict] = {}
+        self.rewards: dict[int, dict] = {}
+        # Key: Goal ID, Value: Sender IDs
+        self.incentives: dict[int, list[int]] = {}
+        self.point_transactions: list[tuple] = []
+        self.completions: list[tuple] = []
+        self.user_stats: dict[int, dict] = {}
+        # Key: (User ID, Period, Start), Value: [Completions, Crumbs]
+        self.user_period_stats: dict[tuple, list] = {}
+        self._ids = count(1)
+
+    def install(self, target: Database) -> None:
+        """Route the query helpers of `target`, normally the `utils.database.database` singleton, to this database"""
+        target.execute = self.execute
+        target.fetch = self.fetch
+        target.fetch_one = self.fetch_one
+        target.fetchval = self.fetchval
+
+    async def _run(self, sql: str, args: tuple):
+        if not isinstance(sql, Statement):
+            raise NotImplementedError(f"The memory database only runs registered statements, got:\n{sql}")
+        handler: Callable | None = getattr(self, "_" + sql.name, None)
+        if handler is None:
+            raise NotImplementedError(f"The memory database does not implement `{sql.name}`")
+        self.round_trips += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return handler(*args)
+
+    async def execute(self, sql: str, *args) -> None:
+        await self._run(sql, args)
+
+    async def fetch(self, sql: str, *args) -> list[dict]:
+        return await self._run(sql, args) or []
+
+    async def fetch_one(self, sql: str, *args) -> dict | None:
+        return await self._run(sql, args)
+
+    async def fetchval(self, sql: str, *args, column=0, timeout=None):
+        row = await self._run(sql, args)
+        if isinstance(row, dict):
+            return list(row.values())[column]
+        return row
+
+    @asynccontextmanager
+    async def transaction(self):
+        yield self
+
+    # Users
+
+    def _user_create(self, user_id):
+        self.users.setdefault(user_id, {"id": user_id, "points": 0, "share_points": 0, "timezone": "UTC",
+                                        "reset_minute": 0})
+
+    def _user_fetch(self, user_id):
+        return self.users.get(user_id)
+
+    def _user_fetch_or_create(self, user_id):
+        self._user_create(user_id)
+        return self.users[user_id]
+
+    def _ledger_credit(self, user_id, points, share_points, reason):
+        u = self.users.get(user_id)
+        if u is None:
+            return None
+        u["points"] += points
+        u["share_points"] += share_points
+        self.point_transactions.append((user_id, points, share_points, reason))
+        return {"points": u["points"], "share_points": u["share_points"]}
+
+    def _debit(self, column, user_id, num, reason):
+        u = self.users.get(user_id)
+        if u is None:
+            return {"ok": False, "balance": None}
+        if u[column] < num:
+            return {"ok": False, "balance": u[column]}
+        u[column] -= num
+        self.point_transactions.append((user_id, -num if column == "points" else 0,
+                                        -num if column == "share_points" else 0, reason))
+        return {"ok": True, "balance": u[column]}
+
+    def _ledger_debit_points(self, user_id, num, reason):
+        return self._debit("points", user_id, num, reason)
+
+    def _ledger_debit_share_points(self, user_id, num, reason):
+        return self._debit("share_points", user_id, num, reason)
+
+    # Goals
+
+    def _goal_row(self, g: dict) -> dict:
+        return g | {"senders": list(g["senders"])}
+
+    def _goal_create(self, user_id, text, reward, repeat):
+        self._user_create(user_id)
+        goal_id = next(self._ids)
+        self.goals[goal_id] = {"id": goal_id, "discord_user": user_id, "text": text, "reward": reward,
+                               "completed_at": None, "repeat": repeat, "reset_at": None,
+                               "created": datetime.now(UTC), "incentive_count": 0, "senders": [],
+                               "completions": 0, "crumbs_earned": 0.0, "current_streak": 0, "best_streak": 0,
+                               "streak_until": None}
+        return goal_id
+
+    def _goal_update(self, goal_id, completed_at, text, reward, repeat, reset_at):
+        self.goals[goal_id].update(completed_at=completed_at, text=text, reward=reward, repeat=repeat,
+                                   reset_at=reset_at)
+
+    def _goal_complete(self, goal_id, now, reset_at, crumbs, streak, today, periods, starts, streak_until):
+        g = self.goals[goal_id]
+        if not (g["completed_at"] is None or (g["reset_at"] is not None and g["reset_at"] <= now)):
+            return None
+        g.update(completed_at=now, reset_at=reset_at, completions=g["completions"] + 1,
+                 crumbs_earned=g["crumbs_earned"] + crumbs, current_streak=streak,
+                 best_streak=max(g["best_streak"], streak), streak_until=streak_until)
+        user_id = g["discord_user"]
+        self.completions.append((goal_id, user_id, crumbs, now))
+
+        s = self.user_stats.get(user_id)
+        if s is None:
+            self.user_stats[user_id] = {"completions": 1, "crumbs_earned": crumbs, "current_streak": 1,
+                                        "best_streak": 1, "last_day": today}
+        else:
+            if s["last_day"] < today:
+                s["current_streak"] = s["current_streak"] + 1 if s["last_day"] == today - timedelta(days=1) else 1
+            s.update(completions=s["completions"] + 1, crumbs_earned=s["crumbs_earned"] + crumbs,
+                     best_streak=max(s["best_streak"], s["current_streak"]), last_day=max(s["last_day"], today))
+        for period, start in zip(periods, starts):
+            p = self.user_period_stats.setdefault((user_id, period, start), [0, 0.0])
+            p[0] += 1
+            p[1] += crumbs
+        balance = self._ledger_credit(user_id, crumbs, 1, "goal_complete")
+        return {"completions": g["completions"], "crumbs_earned": g["crumbs_earned"], "best_streak": g["best_streak"]} \
+            | balance
+
+    @staticmethod
+    def _open(g: dict) -> bool:
+        return g["completed_at"] is None or (g["reset_at"] is not None and g["reset_at"] <= datetime.now(UTC))
+
+    def _goal_fetch(self, goal_id):
+        g = self.goals.get(goal_id)
+        return None if g is None else self._goal_row(g)
+
+    def _user_goals(self, user_id, completed, after=None, before=None):
+        goals = [g for g in self.goals.values() if g["discord_user"] == user_id and (completed or self._open(g))]
+        goals.sort(key=lambda g: (g["created"], g["id"]))
+        if after is not None:
+            goals = [g for g in goals if (g["created"], g["id"]) > after]
+        if before is not None:
+            goals = [g for g in reversed(goals) if (g["created"], g["id"]) < before]
+        return goals
+
+    def _goal_fetch_user_page(self, user_id, limit):
+        return [self._goal_row(g) for g in self._user_goals(user_id, True)[:limit]]
+
+    def _goal_fetch_user_page_after(self, user_id, limit, created, goal_id):
+        return [self._goal_row(g) for g in self._user_goals(user_id, True, (created, goal_id))[:limit]]
+
+    def _goal_fetch_user_open_page(self, user_id, limit):
+        return [self._goal_row(g) for g in self._user_goals(user_id, False)[:limit]]
+
+    def _goal_fetch_user_open_page_after(self, user_id, limit, created, goal_id):
+        return [self._goal_row(g) for g in self._user_goals(user_id, False, (created, goal_id))[:limit]]
+
+    def _goal_fetch_user_page_before(self, user_id, limit, created, goal_id):
+        return [self._goal_row(g) for g in self._user_goals(user_id, True, before=(created, goal_id))[:limit]]
+
+    def _goal_fetch_user_open_page_before(self, user_id, limit, created, goal_id):
+        return [self._goal_row(g) for g in self._user_goals(user_id, False, before=(created, goal_id))[:limit]]
+
+    def _goal_count_user(self, user_id):
+        return len(self._user_goals(user_id, True))
+
+    def _goal_count_user_open(self, user_id):
+        return len(self._user_goals(user_id, False))
+
+    # Stats
+
+    def _user_stats_fetch(self, user_id):
+        return self.user_stats.get(user_id)
+
+    def _user_period_stats_fetch(self, user_id, periods, starts):
+        return [{"period": period, "completions": p[0], "crumbs": p[1]} for period, start in zip(periods, starts)
+                if (p := self.user_period_stats.get((user_id, period, start))) is not None]
+
+    # Incentives
+
+    def _incentive_create(self, sender, goal_id):
+        self.incentives.setdefault(goal_id, []).append(sender)
+        g = self.goals[goal_id]
+        g["incentive_count"] += 1
+        if sender not in g["senders"] and len(g["senders"]) < MAX_SENDERS:
+            g["senders"].append(sender)
+        return {"incentive_count": g["incentive_count"], "senders": list(g["senders"])}
+
+    # Rewards
+
+    def _reward_create(self, user_id, text, cost, renewable):
+        self._user_create(user_id)
+        reward_id = next(self._ids)
+        self.rewards[reward_id] = {"id": reward_id, "discord_user": user_id, "text": text, "cost": cost,
+                                   "renewable": renewable, "created": datetime.now(UTC)}
+        return reward_id
+
+    def _reward_delete(self, reward_id):
+        self.rewards.pop(reward_id, None)
+
+    def _reward_fetch(self, reward_id):
+        return self.rewards.get(reward_id)
+
+    def _reward_redeem(self, user_id, reward_id):
+        r = self.rewards.get(reward_id)
+        if r is None:
+            return None
+        debit = self._debit("points", user_id, r["cost"], "reward_redeem")
+        if debit["ok"] and not r["renewable"]:
+            del self.rewards[reward_id]
+        return {"text": r["text"], "cost": r["cost"], "renewable": r["renewable"]} | debit
+
+    def _user_rewards(self, user_id, after=None, before=None):
+        rewards = sorted((r for r in self.rewards.values() if r["discord_user"] == user_id),
+                         key=lambda r: (r["created"], r["id"]))
+        if after is not None:
+            rewards = [r for r in rewards if (r["created"], r["id"]) > after]
+        if before is not None:
+            rewards = [r for r in reversed(rewards) if (r["created"], r["id"]) < before]
+        return rewards
+
+    def _reward_fetch_user_page(self, user_id, limit):
+        return self._user_rewards(user_id)[:limit]
+
+    def _reward_fetch_user_page_after(self, user_id, limit, created, reward_id):
+        return self._user_rewards(user_id, (created, reward_id))[:limit]
+
+    def _reward_fetch_user_page_before(self, user_id, limit, created, reward_id):
+        return self._user_rewards(user_id, before=(created, reward_id))[:limit]
+
+    def _reward_count_user(self, user_id):
+        return len(self._user_rewards(user_id))
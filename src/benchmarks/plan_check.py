@@ -0,0 +1,196 @@
+"""
+Index Check For Every Registered Statement
+
+Applies the migrations to the database configured by the `DB_*` environment variables, seeds it with a large dataset
+if it is empty, and checks that the plan of every registered statement reads the seeded tables through an index. Run
+from the `src` directory against a disposable database:
+    python -m benchmarks.plan_check [--users 50000] [--goals 1000000] [--smoke]
+
+A statement added without sample arguments in `SAMPLES` fails the check, so new queries are checked too. `--smoke` then
+runs every statement once with its sample arguments through the pool and query helpers of `utils.database`, which the
+memory database used by `benchmarks.handlers` replaces. Its writes are committed.
+"""
+import argparse
+import asyncio
+import json
+import sys
+from datetime import datetime, timedelta, UTC
+
+import asyncpg
+from dotenv import load_dotenv
+
+# Imported for the statements they register
+import models.goal  # noqa: F401
+import models.incentive  # noqa: F401
+import models.ledger  # noqa: F401
+import models.reward  # noqa: F401
+import models.stats  # noqa: F401
+import models.user  # noqa: F401
+import utils.export  # noqa: F401
+from utils.database import database as db
+from utils.migrations import migrate
+
+
+SEEDED_TABLES = {"discord_user", "goal", "reward", "incentive", "point_transaction", "goal_completion", "user_stats",
+                 "user_period_stats"}
+
+USER = 42
+NOW = datetime.now(UTC)
+AFTER = NOW - timedelta(days=30)
+
+# Key: Statement Name, Value: The arguments it is explained with
+SAMPLES: dict[str, tuple] = {
+    "ledger_credit": (USER, 1.5, 1, "plan_check"),
+    "ledger_debit_points": (USER, 1, "plan_check"),
+    "ledger_debit_share_points": (USER, 1, "plan_check"),
+    "ledger_recent_users": (500, 48),
+    "user_create": (USER,),
+    "user_fetch": (USER,),
+    "user_fetch_or_create": (USER,),
+    "user_fetch_many": (list(range(USER, USER + 500)),),
+    "user_set_reset_time": (USER, "Europe/London", 450),
+    "incentive_create": (USER, 1000),
+    "incentive_fetch": (1000, USER),
+    "incentive_fetch_goal": (1000,),
+    "goal_create": (USER, "plan_check", 10, 0),
+    "goal_update": (1000, NOW, "plan_check", 10, 1, NOW + timedelta(days=1)),
+    "goal_complete": (1000, NOW, NOW + timedelta(days=1), 10.0, 2, NOW.date(), ["day", "week", "month"],
+                      [NOW.date()] * 3, NOW + timedelta(days=2)),
+    "goal_fetch": (1000,),
+    "goal_fetch_user_page": (USER, 5),
+    "goal_fetch_user_page_after": (USER, 5, AFTER, 1000),
+    "goal_fetch_user_open_page": (USER, 5),
+    "goal_fetch_user_open_page_after": (USER, 5, AFTER, 1000),
+    "goal_fetch_user_page_before": (USER, 5, AFTER, 1000),
+    "goal_fetch_user_open_page_before": (USER, 5, AFTER, 1000),
+    "goal_preload_users_open": (list(range(USER, USER + 500)), 2000),
+    "goal_count_user": (USER,),
+    "goal_count_user_open": (USER,),
+    "reward_create": (USER, "plan_check", 10, True),
+    "reward_delete": (1000,),
+    "reward_fetch": (1000,),
+    "reward_fetch_user_page": (USER, 5),
+    "reward_fetch_user_page_after": (USER, 5, AFTER, 1000),
+    "reward_fetch_user_page_before": (USER, 5, AFTER, 1000),
+    "reward_redeem": (USER, 1000),
+    "reward_count_user": (USER,),
+    "user_stats_fetch": (USER,),
+    "user_period_stats_fetch": (USER, ["day", "week", "month"], [NOW.date()] * 3),
+    "cache_notify": ("plan_check", ["{}"]),
+    "export_users": ([USER],),
+    "export_goals": ([USER],),
+    "export_rewards": ([USER],),
+    "export_incentives": ([USER],),
+    "export_completions": ([USER],),
+    "export_transactions": ([USER],),
+}
+
+# A third of the goals are completed, the repeating ones reopen within a week. Ledger records and completions are
+# spread over a year so the recent ones are a small part of the table, and users have a month of period stats.
+SEED = """
+    INSERT INTO discord_user (id, points, share_points)
+    SELECT i, i % 500, i % 7 FROM generate_series(1, {users}) AS i;
+
+    INSERT INTO goal (discord_user, text, reward, completed_at, repeat, reset_at, created)
+    SELECT i % {users} + 1, 'Goal ' || i, i % 50, CASE WHEN i % 3 = 0 THEN now() END, i % 5,
+           CASE WHEN i % 3 = 0 AND i % 5 > 0 THEN now() + make_interval(mins => 1 + i % 10000) END,
+           now() - make_interval(secs => i)
+    FROM generate_series(1, {goals}) AS i;
+
+    INSERT INTO reward (discord_user, text, cost, renewable, created)
+    SELECT i % {users} + 1, 'Reward ' || i, i % 100, i % 4 > 0, now() - make_interval(secs => i)
+    FROM generate_series(1, {goals} / 5) AS i;
+
+    INSERT INTO incentive (goal, sender)
+    SELECT i % {goals} + 1, i % {users} + 1 FROM generate_series(1, {goals} / 3) AS i;
+
+    INSERT INTO point_transaction (discord_user, points, share_points, reason, created)
+    SELECT i % {users} + 1, i % 50, i % 2, 'seed', now() - make_interval(secs => i % 31536000)
+    FROM generate_series(1, {goals}) AS i;
+
+    INSERT INTO goal_completion (goal, discord_user, crumbs, completed)
+    SELECT i % {goals} + 1, (i % {goals} + 1) % {users} + 1, i % 50, now() - make_interval(secs => i % 31536000)
+    FROM generate_series(1, {goals}) AS i;
+
+    INSERT INTO user_stats (discord_user, completions, crumbs_earned, current_streak, best_streak, last_day)
+    SELECT i, i % 100, i % 1000, i % 10, i % 30, current_date - i % 5 FROM generate_series(1, {users}) AS i;
+
+    INSERT INTO user_period_stats (discord_user, period, start, completions, crumbs)
+    SELECT i % {users} + 1, p.period, date_trunc(p.period, current_date - i / {users})::date, 1, 1
+    FROM generate_series(1, {users} * 30) AS i CROSS JOIN unnest(ARRAY['day', 'week', 'month']) AS p(period)
+    ON CONFLICT DO NOTHING;
+"""
+
+
+def seq_scans(plan: dict) -> set[str]:
+    """:returns The seeded tables the plan reads without an index"""
+    found = set()
+    if plan["Node Type"] == "Seq Scan" and plan.get("Relation Name") in SEEDED_TABLES:
+        found.add(plan["Relation Name"])
+    for child in plan.get("Plans", []):
+        found |= seq_scans(child)
+    return found
+
+
+async def seed(conn: asyncpg.Connection, users: int, goals: int) -> None:
+    if await conn.fetchval("SELECT EXISTS(SELECT 1 FROM discord_user);"):
+        print("The database already has data, checking against it without seeding")
+        return
+    print(f"Seeding {users} users and {goals} goals")
+    await conn.execute(SEED.format(users=users, goals=goals))
+    # Index only scans need the visibility map, and the planner needs statistics
+    await conn.execute("VACUUM ANALYZE;")
+
+
+async def smoke() -> bool:
+    """Run every registered statement through the pool, :returns False if any of them failed"""
+    ok = True
+    await db.connect()
+    for name, sql in db._statements.items():
+        if name not in SAMPLES:
+            continue
+        try:
+            await db.fetch(sql, *SAMPLES[name])
+            print(f"RAN      {name}")
+        except (asyncpg.PostgresError, asyncpg.InterfaceError, TypeError) as e:
+            print(f"FAILED   {name}: {type(e).__name__}: {e}")
+            ok = False
+    return ok
+
+
+async def check(users: int, goals: int) -> bool:
+    await migrate()
+    conn = await asyncpg.connect(**db.connection_args())
+    try:
+        await seed(conn, users, goals)
+        ok = True
+        for name, sql in db._statements.items():
+            if name not in SAMPLES:
+                print(f"MISSING  {name} has no sample arguments in benchmarks.plan_check.SAMPLES")
+                ok = False
+                continue
+            # Without ANALYZE the statement is planned but not run, so writes are safe to explain
+            plan = await conn.fetchval("EXPLAIN (FORMAT JSON) " + sql, *SAMPLES[name])
+            scans = seq_scans(json.loads(plan)[0]["Plan"])
+            if scans:
+                print(f"SEQ SCAN {name} reads {', '.join(sorted(scans))} without an index")
+                ok = False
+            else:
+                print(f"OK       {name}")
+        return ok
+    finally:
+        await conn.close()
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=50_000)
+    parser.add_argument("--goals", type=int, default=1_000_000)
+    parser.add_argument("--smoke", action="store_true", help="Also run every statement through the pool")
+    args = parser.parse_args()
+
+    async def main() -> bool:
+        ok = await check(args.users, args.goals)
+        return await smoke() and ok if args.smoke else ok
+    sys.exit(0 if asyncio.run(main()) else 1)
@@ -0,0 +1,49 @@
+"""
+Concurrency Check For Reward Redemption
+
+Fires many simultaneous redeems at the database configured by the `DB_*` environment variables and checks that a one
+time reward is only redeemed once and that a balance is never overdrawn. Run from the `src` directory against a
+disposable database with the bot's schema:
+    python -m benchmarks.redeem_race [concurrency]
+"""
+import asyncio
+import sys
+
+from dotenv import load_dotenv
+
+from models.reward import Reward
+from models.user import User
+from utils.database import database as db
+
+
+USER_ID = 2_000_000
+
+
+async def race(concurrency: int) -> bool:
+    u = await User.fetch(USER_ID)
+    await u.use_points(u.points, reason="redeem_race_reset")
+    await u.add_points(concurrency * 10, reason="redeem_race")
+
+    once = Reward(USER_ID, "Redeem race one time reward", 1, False)
+    await once.create()
+    results = await asyncio.gather(*(Reward.redeem(once.id, USER_ID) for _ in range(concurrency)))
+    once_redeemed = sum(1 for r in results if r is not None and r["ok"])
+    print(f"One time reward redeemed {once_redeemed} times by {concurrency} concurrent redeems (expected 1)")
+
+    # Each redeem costs 7 crumbs per racer, so only some of the racers can afford it
+    renewable = Reward(USER_ID, "Redeem race renewable reward", 7 * concurrency, True)
+    await renewable.create()
+    results = await asyncio.gather(*(Reward.redeem(renewable.id, USER_ID) for _ in range(concurrency)))
+    redeemed = sum(1 for r in results if r["ok"])
+    balance = await db.fetchval("SELECT points FROM discord_user WHERE id=$1;", USER_ID)
+    expected = concurrency * 10 - 1 - redeemed * 7 * concurrency
+    print(f"Renewable reward redeemed {redeemed} times, balance {balance} (expected {expected}, never negative)")
+
+    await db.execute("DELETE FROM reward WHERE id=$1;", renewable.id)
+    return once_redeemed == 1 and redeemed == (concurrency * 10 - 1) // (7 * concurrency) and balance == expected
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    ok = asyncio.run(race(int(sys.argv[1]) if len(sys.argv) > 1 else 50))
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,110 @@
+"""
+Reset Cost Of Repeating Goals, Written At Reset Time Or Evaluated When Read
+
+Builds two copies of a goal table in a scratch schema of the database configured by the `DB_*` environment variables
+and compares them at a reset boundary:
+- eager, a completed flag that a task clears in batches once reset_at passes, like the bot did before
+- lazy, completed_at and reset_at that are never written at reset time, the open check is part of each read
+For each it reports the time and WAL written to reset the goals that became due, and the time of the open goal
+queries a user's list runs. Run from the `src` directory against a disposable database:
+    python -m benchmarks.reset_cost [--goals 1000000] [--users 50000] [--batch 1000]
+"""
+import argparse
+import asyncio
+from time import perf_counter
+
+import asyncpg
+from dotenv import load_dotenv
+
+from utils.database import database as db
+
+
+SCHEMA = "reset_cost"
+
+# Every goal repeats daily and was completed, half of them are due for their reset
+SETUP = """
+    DROP SCHEMA IF EXISTS {schema} CASCADE;
+    CREATE SCHEMA {schema};
+
+    CREATE TABLE {schema}.eager (
+        id bigint PRIMARY KEY, discord_user bigint NOT NULL, created timestamptz NOT NULL,
+        completed boolean NOT NULL, reset_at timestamptz
+    );
+    INSERT INTO {schema}.eager
+    SELECT i, i % {users}, now() - make_interval(secs => i), true,
+           now() + make_interval(hours => CASE WHEN i % 2 = 0 THEN -1 ELSE 1 END)
+    FROM generate_series(1, {goals}) AS i;
+    CREATE INDEX ON {schema}.eager (discord_user, completed, created, id);
+    CREATE INDEX ON {schema}.eager (reset_at) WHERE completed;
+
+    CREATE TABLE {schema}.lazy (
+        id bigint PRIMARY KEY, discord_user bigint NOT NULL, created timestamptz NOT NULL,
+        completed_at timestamptz, reset_at timestamptz
+    );
+    INSERT INTO {schema}.lazy SELECT id, discord_user, created, now() - interval '1 day', reset_at FROM {schema}.eager;
+    CREATE INDEX ON {schema}.lazy (discord_user, created, id);
+
+    VACUUM ANALYZE {schema}.eager, {schema}.lazy;
+"""
+
+EAGER_RESET = """
+    WITH due AS (
+        SELECT id FROM {schema}.eager WHERE completed AND reset_at <= now()
+        ORDER BY reset_at LIMIT $1 FOR UPDATE SKIP LOCKED
+    )
+    UPDATE {schema}.eager SET completed=FALSE, reset_at=NULL FROM due WHERE eager.id=due.id;
+"""
+EAGER_OPEN_PAGE = "SELECT id FROM {schema}.eager WHERE discord_user=$1 AND completed=false ORDER BY created, id LIMIT 5;"
+LAZY_OPEN_PAGE = ("SELECT id FROM {schema}.lazy WHERE discord_user=$1 AND (completed_at IS NULL OR reset_at <= now()) "
+                  "ORDER BY created, id LIMIT 5;")
+
+
+async def wal_bytes(conn: asyncpg.Connection, since: str) -> int:
+    return await conn.fetchval("SELECT pg_wal_lsn_diff(pg_current_wal_lsn(), $1::pg_lsn)::bigint;", since)
+
+
+async def page_time(conn: asyncpg.Connection, sql: str, users: int) -> float:
+    """:returns The mean milliseconds of the open goal page for a sample of users"""
+    sample = range(0, users, max(users // 500, 1))
+    start = perf_counter()
+    for user in sample:
+        await conn.fetch(sql, user)
+    return (perf_counter() - start) / len(sample) * 1000
+
+
+async def main(goals: int, users: int, batch: int) -> None:
+    conn = await asyncpg.connect(**db.connection_args())
+    try:
+        print(f"Building {goals} goals for {users} users in both models")
+        await conn.execute(SETUP.format(schema=SCHEMA, goals=goals, users=users))
+
+        lsn = await conn.fetchval("SELECT pg_current_wal_lsn()::text;")
+        start = perf_counter()
+        reset = 0
+        while True:
+            status = await conn.execute(EAGER_RESET.format(schema=SCHEMA), batch)
+            count = int(status.split()[-1])
+            reset += count
+            if count < batch:
+                break
+        elapsed = perf_counter() - start
+        wal = await wal_bytes(conn, lsn)
+        print(f"eager reset  {reset:>9} rows written {elapsed:>8.2f}s {wal / 1024 / 1024:>9.1f}MB WAL")
+        print("lazy reset           0 rows written     0.00s       0.0MB WAL")
+
+        eager = await page_time(conn, EAGER_OPEN_PAGE.format(schema=SCHEMA), users)
+        lazy = await page_time(conn, LAZY_OPEN_PAGE.format(schema=SCHEMA), users)
+        print(f"open page    eager {eager:.3f}ms, lazy {lazy:.3f}ms")
+    finally:
+        await conn.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE;")
+        await conn.close()
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--goals", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=50_000)
+    parser.add_argument("--batch", type=int, default=1000)
+    args = parser.parse_args()
+    asyncio.run(main(args.goals, args.users, args.batch))
@@ -0,0 +1,89 @@
+"""
+Round Trips Per Database Call Before And After Pool Level Connection Setup
+
+Runs against the database configured by the `DB_*` environment variables, from the `src` directory:
+    python -m benchmarks.round_trips [iterations]
+
+The database must already have the bot's tables. Round trips are counted as the writes the client makes to the
+server socket, which includes the reset query the pool sends when a connection is released.
+"""
+import asyncio
+import json
+import sys
+from time import perf_counter
+
+import asyncpg
+from dotenv import load_dotenv
+
+from utils.database import Database, Statement
+
+
+class CountingDatabase(Database):
+    def __init__(self) -> None:
+        super().__init__()
+        self.writes = 0
+
+    def _count(self, conn: asyncpg.Connection) -> None:
+        transport = conn._transport
+        write, writelines = transport.write, transport.writelines
+
+        def counting_write(data):
+            self.writes += 1
+            write(data)
+
+        def counting_writelines(data):
+            self.writes += 1
+            writelines(data)
+
+        transport.write = counting_write
+        transport.writelines = counting_writelines
+
+    async def _init_connection(self, conn: asyncpg.Connection) -> None:
+        self._count(conn)
+        await super()._init_connection(conn)
+
+
+class LegacyDatabase(CountingDatabase):
+    """Reproduces The Old Behaviour: The Codec Is Set On Every Acquire"""
+
+    async def _init_connection(self, conn: asyncpg.Connection) -> None:
+        self._count(conn)
+
+    async def _acquire(self):
+        conn = await super()._acquire()
+        await conn.set_type_codec("jsonb", encoder=json.dumps, decoder=json.loads, schema="pg_catalog")
+        return conn
+
+
+async def measure(db: CountingDatabase, stmt: Statement, iterations: int) -> dict[str, float]:
+    await db.connect()
+    # Let every pooled connection finish its setup before counting
+    await db.fetch_one(stmt, 0)
+    db.writes = 0
+
+    start = perf_counter()
+    for _ in range(iterations):
+        await db.fetch_one(stmt, 0)
+    elapsed = perf_counter() - start
+
+    await db._connection_pool.close()
+    return {"round_trips_per_call": db.writes / iterations, "ms_per_call": elapsed / iterations * 1000}
+
+
+async def main(iterations: int) -> None:
+    legacy, current = LegacyDatabase(), CountingDatabase()
+    sql = "SELECT id, points, share_points FROM discord_user WHERE id=$1;"
+    legacy_stmt = legacy.statement("bench_user_fetch", sql)
+    current_stmt = current.statement("bench_user_fetch", sql)
+
+    results = {
+        "before": await measure(legacy, legacy_stmt, iterations),
+        "after": await measure(current, current_stmt, iterations),
+    }
+    for name, r in results.items():
+        print(f"{name:>6}: {r['round_trips_per_call']:.2f} round trips/call, {r['ms_per_call']:.3f} ms/call")
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000))
@@ -0,0 +1,126 @@
+import csv
+import io
+import json
+from collections.abc import Awaitable, Callable, Iterator
+from time import perf_counter
+
+from discord import Bot, ApplicationContext, Attachment, Option, SlashCommandGroup, ui
+
+from commands.create_goal import check_goal
+from commands.shop import check_reward
+from models.goal import Goal
+from models.reward import Reward
+from utils import component_factory as cf
+
+
+MAX_IMPORT_BYTES = 2 * 1024 * 1024
+MAX_IMPORT_ROWS = 10_000
+MAX_ERRORS_SHOWN = 10
+
+# Checks one row and returns the item or the problems with it
+Check = Callable[[int, dict[str, str]], tuple[object | None, list[str]]]
+
+
+def read_rows(data: bytes, filename: str) -> Iterator[dict[str, str]]:
+    """
+    Yields the rows of an import one at a time, with lower case column names and every value as a string
+    CSV files need a header row. `.jsonl` files have an object per line and `.json` files a list of objects.
+    """
+    name = filename.lower()
+    if name.endswith(".jsonl"):
+        items = (json.loads(line) for line in io.TextIOWrapper(io.BytesIO(data), encoding="utf-8-sig") if line.strip())
+    elif name.endswith(".json"):
+        items = json.loads(data)
+        if not isinstance(items, list):
+            raise ValueError("A JSON import must be a list of objects")
+    else:
+        lines = io.TextIOWrapper(io.BytesIO(data), encoding="utf-8-sig", newline="")
+        for row in csv.DictReader(lines):
+            yield {k.strip().lower(): v or "" for k, v in row.items() if k is not None}
+        return
+
+    for item in items:
+        if not isinstance(item, dict):
+            raise ValueError("Every item in a JSON import must be an object")
+        # JSON booleans become "True" and "False", which the checks read case insensitively
+        yield {k.strip().lower(): str(v) for k, v in item.items() if v is not None}
+
+
+def parse_import(data: bytes, filename: str, user_id: int, check: Check) -> tuple[list, list[str]]:
+    """
+    Check every row of an import
+    :returns The items, and the problems prefixed with their row number. Nothing should be imported if there are any.
+    """
+    items, errors = [], []
+    for number, row in enumerate(read_rows(data, filename), start=1):
+        if number > MAX_IMPORT_ROWS:
+            errors.append(f"An import can have at most {MAX_IMPORT_ROWS} rows")
+            break
+        item, problems = check(user_id, row)
+        if problems:
+            errors.extend(f"Row {number}: {p}" for p in problems)
+        else:
+            items.append(item)
+    return items, errors
+
+
+def check_goal_row(user_id: int, row: dict[str, str]) -> tuple[Goal | None, list[str]]:
+    return check_goal(user_id, row.get("text", ""), row.get("repeat") or "never", row.get("reward", ""))
+
+
+def check_reward_row(user_id: int, row: dict[str, str]) -> tuple[Reward | None, list[str]]:
+    return check_reward(user_id, row.get("text", ""), row.get("cost", ""), row.get("renewable") or "forever")
+
+
+async def run_import(ctx: ApplicationContext, file: Attachment, check: Check,
+                     create_many: Callable[[int, list], Awaitable[None]], noun: str) -> None:
+    if file.size > MAX_IMPORT_BYTES:
+        await ctx.respond(view=ui.DesignerView(
+            await cf.fail(f"Import files can be at most {MAX_IMPORT_BYTES // 1024 // 1024}MB")
+        ), ephemeral=True)
+        return
+
+    await ctx.defer(ephemeral=True)
+    start = perf_counter()
+    data = await file.read()
+    try:
+        items, errors = parse_import(data, file.filename, ctx.author.id, check)
+    except (ValueError, csv.Error) as e:
+        # Covers invalid JSON and files that are not UTF-8
+        await ctx.respond(view=ui.DesignerView(await cf.input_error("Could Not Read The File", [str(e)])),
+                          ephemeral=True)
+        return
+
+    if errors:
+        shown = errors[:MAX_ERRORS_SHOWN]
+        if len(errors) > MAX_ERRORS_SHOWN:
+            shown.append(f"And {len(errors) - MAX_ERRORS_SHOWN} more problems")
+        await ctx.respond(view=ui.DesignerView(await cf.input_error("Nothing Was Imported", shown)),
+                          ephemeral=True)
+        return
+    if not items:
+        await ctx.respond(view=ui.DesignerView(await cf.fail(f"The file does not have any {noun}")), ephemeral=True)
+        return
+
+    await create_many(ctx.author.id, items)
+    elapsed = perf_counter() - start
+    await ctx.respond(view=ui.DesignerView(
+        await cf.success(f"Imported **{len(items)}** {noun} in {elapsed:.2f}s")
+    ), ephemeral=True)
+
+
+import_group = SlashCommandGroup("import", "Bring In Goals Or Rewards From Another Tracker")
+
+
+@import_group.command(description="Import Goals From A CSV Or JSON File With text, reward And repeat Columns")
+async def goals(ctx: ApplicationContext, file: Option(Attachment, description="A CSV, JSON Or JSON Lines File")):
+    await run_import(ctx, file, check_goal_row, Goal.create_many, "goals")
+
+
+@import_group.command(description="Import Rewards From A CSV Or JSON File With text, cost And renewable Columns")
+async def rewards(ctx: ApplicationContext, file: Option(Attachment, description="A CSV, JSON Or JSON Lines File")):
+    await run_import(ctx, file, check_reward_row, Reward.create_many, "rewards")
+
+
+def setup(bot: Bot):
+    bot.add_application_command(import_group)
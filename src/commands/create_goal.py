@@ -1,3 +1,4 @@
+from collections import Counter
 from random import choice, randint
 
 from discord import Bot, ApplicationContext, SelectOption, slash_command, Interaction, AllowedMentions
@@ -7,8 +8,13 @@ from models.goal import Goal, RepeatType
 from models.incentive import Incentive
 from models.user import User
 from utils import component_factory as cf
+from utils.instrumentation import timed
+from utils.router import router
 
 
+# Text displays are limited to 4000 characters
+MAX_INCENTIVES_LENGTH = 3900
+
 GOAL_TEXT_PLACEHOLDERS = [
     "Maintain a seamless \"bread loaf\" form for at least 20 minutes.",
     "Complete five laps around the living room at top speed at 3 AM.",
@@ -27,45 +33,81 @@ GOAL_TEXT_PLACEHOLDERS = [
     "Secure a lap for a minimum of one hour of synchronized purring.",
 ]
 
+# The limits of the modal's inputs, imported goals are held to the same ones
+GOAL_TEXT_LENGTH = 400
+REWARD_DIGITS = 2
+
+
+def parse_repeat(value: str) -> RepeatType | None:
+    """:returns The repeat type from its value, like `1`, or its name, like `daily`"""
+    value = value.strip()
+    if value.isdigit():
+        try:
+            return RepeatType(int(value))
+        except ValueError:
+            return None
+    return RepeatType.__members__.get(value.upper())
+
+
+def check_goal(user_id: int, text: str, repeat: str, crumbs: str) -> tuple[Goal | None, list[str]]:
+    """
+    Check the fields of a new goal, the modal and imports use the same rules
+    :returns The goal, or None and the problems with it
+    """
+    errors = []
+    if not 0 < len(text) <= GOAL_TEXT_LENGTH:
+        errors.append(f"Goal must be between 1 and {GOAL_TEXT_LENGTH} characters")
+    repeat_type = parse_repeat(repeat)
+    if repeat_type is None:
+        errors.append("Repeat must be one of " + ", ".join(r.name.title() for r in RepeatType))
+    try:
+        reward = int(crumbs)
+    except ValueError:
+        reward = 0
+    if reward <= 0:
+        errors.append("Cookie Crumb Reward must be a positive integer")
+    elif reward >= 10 ** REWARD_DIGITS:
+        errors.append(f"Cookie Crumb Reward must be at most {REWARD_DIGITS} digits")
+
+    if errors:
+        return None, errors
+    return Goal(user_id, text, repeat_type, reward), []
+
 
 class CreateGoal(ui.DesignerModal):
     def __init__(self):
         super().__init__(title="Create A Personal Goal")
 
-        self.goal_text = ui.TextInput(style=InputTextStyle.long, placeholder=choice(GOAL_TEXT_PLACEHOLDERS), max_length=400)
+        self.goal_text = ui.TextInput(style=InputTextStyle.long, placeholder=choice(GOAL_TEXT_PLACEHOLDERS),
+                                   max_length=GOAL_TEXT_LENGTH)
         self.add_item(ui.Label("Goal", self.goal_text, description="Give a brief description of your goal"))
 
         self.repeat_select = ui.Select(options=[
                                 SelectOption(label="Never", description="A one time goal", default=True, value="0"),
-                                SelectOption(label="Daily", description="Repeat once a day at midnight UTC", value="1"),
-                                SelectOption(label="Weekly", description="Repeat once a week on Mondays at midnight UTC", value="2"),
-                                SelectOption(label="Monthly", description="Repeat once a month on the 1st at midnight UTC", value="3"),
+                                SelectOption(label="Daily", description="Repeat once a day at your reset time", value="1"),
+                                SelectOption(label="Weekly", description="Repeat once a week on Mondays at your reset time", value="2"),
+                                SelectOption(label="Monthly", description="Repeat once a month on the 1st at your reset time", value="3"),
                                 SelectOption(label="Yearly",
-                                             description="Repeat once a year on January 1st at midnight UTC",
+                                             description="Repeat once a year on January 1st at your reset time",
                                              value="4"),
                             ])
         self.add_item(ui.Label("Repeat", self.repeat_select))
 
-        self.crumb_count = ui.TextInput(placeholder=str(randint(2, 10)), max_length=2)
+        self.crumb_count = ui.TextInput(placeholder=str(randint(2, 10)), max_length=REWARD_DIGITS)
         self.add_item(ui.Label("Cookie Crumb Reward", self.crumb_count,
                             description="How much of a reward does this task deserve? We recommend 10 Crumbs should "
                                         "equal one small reward."))
 
+    @timed("create_goal")
     async def callback(self, interaction: Interaction):
-        try:
-            crumbs = int(self.crumb_count.value)
-        except ValueError:
-            crumb_error = True
-        else:
-            crumb_error = crumbs <= 0
-
-        if crumb_error:
+        g, errors = check_goal(interaction.user.id, self.goal_text.value, self.repeat_select.values[0],
+                               self.crumb_count.value)
+        if errors:
             await interaction.respond(view=ui.DesignerView(await cf.input_error(
-                "Failed To Process Input", ["Cookie Crumb Reward must be a positive integer"]
+                "Failed To Process Input", errors
             )), ephemeral=True)
             return
 
-        g = Goal(interaction.user.id, self.goal_text.value, RepeatType(int(self.repeat_select.values[0])), crumbs)
         await g.create()
 
         await interaction.respond(view=g.display(), allowed_mentions=AllowedMentions.none())
@@ -76,20 +118,18 @@ async def goal(ctx: ApplicationContext):
     await ctx.send_modal(CreateGoal())
 
 
-# Handle Interactions Manually Instead Of Using View Callbacks
-async def on_interaction(interaction: Interaction):
-    if interaction.custom_id == "complete_goal":
-        await complete_goal_button(interaction)
-    elif interaction.custom_id == "add_incentive":
-        await add_incentive_button(interaction)
-
-
 async def complete_goal_button(interaction: Interaction) -> None:
     g = await Goal.fetch(interaction.message.get_component("complete_goal").id)
     if g.user != interaction.user.id:
         await interaction.respond(view=ui.DesignerView(await cf.fail("You cannot complete other users goals")), ephemeral=True)
         return
-    await g.complete()
+    if not await g.complete():
+        # Another click or shard completed it first, so the cached goal is out of date
+        Goal._cache.pop(g.id)
+        g = await Goal.fetch(g.id)
+        await interaction.edit(view=g.display())
+        await interaction.respond(view=ui.DesignerView(await cf.fail("This goal was already completed")), ephemeral=True)
+        return
     await interaction.edit(view=g.display())
 
 
@@ -101,21 +141,40 @@ async def add_incentive_button(interaction: Interaction) -> None:
         return
 
     u = await User.fetch(interaction.user.id)
-    if not await u.use_share_points(1):
+    if not await u.use_share_points(1, reason="incentive"):
         await interaction.respond(
             view=ui.DesignerView(await cf.fail("You Do Not Have Any Chocolate Nibbles. Every Goal You Complete Earns You One.")),
             ephemeral=True)
         return
 
     incentive = Incentive(interaction.user.id, g.id)
-    await incentive.create()
-    g.incentives.append(incentive)
+    g.set_incentives(*await incentive.create())
     await interaction.edit(view=g.display())
 
     await interaction.respond(view=await cf.general(f"You Have {u.share_points} Chocolate Nibbles Left"), ephemeral=True)
 
 
+async def goal_incentives_button(interaction: Interaction) -> None:
+    goal_id = int(interaction.custom_id.split("::")[1])
+    counts = Counter(i.sender for i in await Incentive.fetch_all_goal(goal_id))
+    lines = [f"<@{sender}> Added {n} chocolate nibble{'s' if n > 1 else ''}" for sender, n in counts.most_common()]
+
+    shown, length = [], 0
+    for line in lines:
+        if length + len(line) > MAX_INCENTIVES_LENGTH:
+            shown.append(f"*And {len(lines) - len(shown)} more*")
+            break
+        shown.append(line)
+        length += len(line) + 1
+    await interaction.respond(view=ui.DesignerView(await cf.general(
+        "\n".join(shown) or "Nobody has added a chocolate nibble yet", "Everyone Who Gave A Boost"
+    )), ephemeral=True)
+
+
 def setup(bot: Bot):
     bot.add_application_command(goal)
 
-    bot.add_listener(on_interaction)
+    # Handle Interactions Manually Instead Of Using View Callbacks
+    router.add("complete_goal", complete_goal_button)
+    router.add("add_incentive", add_incentive_button)
+    router.add("goal_incentives", goal_incentives_button)
@@ -0,0 +1,33 @@
+from tempfile import SpooledTemporaryFile
+
+from discord import Bot, ApplicationContext, File, slash_command, ui
+
+from utils import component_factory as cf
+from utils.export import write_export
+
+
+# Exports smaller than this stay in memory, larger ones are spooled to a temporary file
+SPOOL_BYTES = 1024 * 1024
+FILENAME = "meowtivation-export.jsonl.gz"
+
+
+@slash_command(description="Download Your Goals, Rewards, Chocolate Nibbles And Crumb History")
+async def export(ctx: ApplicationContext):
+    await ctx.defer(ephemeral=True)
+    with SpooledTemporaryFile(max_size=SPOOL_BYTES) as f:
+        rows = await write_export(f, [ctx.author.id])
+        size = f.tell()
+        if size > ctx.interaction.attachment_size_limit:
+            await ctx.respond(view=ui.DesignerView(await cf.fail(
+                f"Your export is {size / 1024 / 1024:.1f}MB, which is too big to send here. Ask the bot owner for it."
+            )), ephemeral=True)
+            return
+        f.seek(0)
+
+        c = await cf.general(f"Your data as JSON Lines, **{rows}** records compressed with gzip", "Your Export")
+        c.add_item(ui.File(f"attachment://{FILENAME}"))
+        await ctx.respond(view=ui.DesignerView(c), file=File(f, filename=FILENAME), ephemeral=True)
+
+
+def setup(bot: Bot):
+    bot.add_application_command(export)
@@ -1,25 +1,53 @@
-from datetime import time, UTC, datetime
-from discord.ext import tasks
-
-from models.goal import RepeatType
-from utils.database import database as db
-
-
-@tasks.loop(time=time(tzinfo=UTC))
-async def uncomplete():
-    dt = datetime.now(UTC)
-
-    sql = "UPDATE goal SET completed=FALSE WHERE repeat=$1;"
-
-    await db.execute(sql, RepeatType.DAILY)
-
-    if dt.weekday() == 0:
-        await db.execute(sql, RepeatType.WEEKLY)
-    if dt.day == 1:
-        await db.execute(sql, RepeatType.MONTHLY)
-    if dt.day == 1 and dt.month == 1:
-        await db.execute(sql, RepeatType.YEARLY)
-
-
-def setup(bot):
-    uncomplete.start()
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError, available_timezones
+
+from discord import Bot, ApplicationContext, Option, slash_command, ui
+from discord.utils import basic_autocomplete
+
+from models.user import User
+from utils import component_factory as cf
+
+
+# Nothing resets repeating goals, Goal.completed is false again once a completed goal's reset_at has passed
+
+
+def parse_time(value: str) -> int | None:
+    """:returns Minutes after midnight of a 24 hour `HH:MM` time"""
+    hours, _, minutes = value.strip().partition(":")
+    if not (hours.isdigit() and minutes.isdigit() and int(hours) < 24 and int(minutes) < 60):
+        return None
+    return int(hours) * 60 + int(minutes)
+
+
+@slash_command(description="Set When Your Repeating Goals Reset")
+async def reset_time(ctx: ApplicationContext,
+                     timezone: Option(str, description="Your Timezone, Like Europe/London",
+                                      autocomplete=basic_autocomplete(sorted(available_timezones()))),
+                     time: Option(str, description="The Time Of Day In 24 Hour HH:MM", default="00:00")):
+    try:
+        ZoneInfo(timezone)
+    except (ZoneInfoNotFoundError, ValueError):
+        zone_error = True
+    else:
+        zone_error = False
+    minute = parse_time(time)
+
+    errors = []
+    if zone_error:
+        errors.append("Timezone must be a timezone name like Europe/London or America/New_York")
+    if minute is None:
+        errors.append("Time must be a 24 hour time like 07:30")
+    if errors:
+        await ctx.respond(view=ui.DesignerView(await cf.input_error("Failed To Process Input", errors)),
+                          ephemeral=True)
+        return
+
+    u = await User.fetch(ctx.author.id)
+    await u.set_reset_time(timezone, minute)
+    await ctx.respond(view=ui.DesignerView(await cf.success(
+        f"Your repeating goals will reopen at **{time.strip()}** {timezone}. Goals you already completed still reopen "
+        "at the time they were going to."
+    )), ephemeral=True)
+
+
+def setup(bot: Bot):
+    bot.add_application_command(reset_time)
@@ -1,3 +1,5 @@
+import asyncio
+from math import ceil
 from random import choice, randint
 
 from discord import Bot, ApplicationContext, SelectOption, slash_command, Interaction
@@ -6,6 +8,13 @@ from discord import ui
 from models.reward import Reward
 from models.user import User
 from utils import component_factory as cf
+from utils.edits import edits
+from utils.instrumentation import timed
+from utils.pagination import PageCursor, nav_row
+from utils.router import router
+
+
+PAGE_SIZE = 5
 
 
 REWARD_TEXT_PLACEHOLDER = [
@@ -30,15 +39,46 @@ REWARD_TEXT_PLACEHOLDER = [
     "Watch 20 Minutes of Bird TV",
 ]
 
+# The limits of the modal's inputs, imported rewards are held to the same ones
+REWARD_TEXT_LENGTH = 400
+COST_DIGITS = 6
+RENEWABLE_VALUES = {"forever": True, "once": False, "true": True, "false": False, "yes": True, "no": False}
+
+
+def check_reward(user_id: int, text: str, cost: str, renewable: str) -> tuple[Reward | None, list[str]]:
+    """
+    Check the fields of a new reward, the modal and imports use the same rules
+    :param renewable: `forever` or `once`, imports can also use `true` or `false`
+    :returns The reward, or None and the problems with it
+    """
+    errors = []
+    if not 0 < len(text) <= REWARD_TEXT_LENGTH:
+        errors.append(f"Reward must be between 1 and {REWARD_TEXT_LENGTH} characters")
+    try:
+        crumbs = int(cost)
+    except ValueError:
+        crumbs = 0
+    if crumbs <= 0:
+        errors.append("The cost of the reward must be a positive integer")
+    elif crumbs >= 10 ** COST_DIGITS:
+        errors.append(f"The cost of the reward must be at most {COST_DIGITS} digits")
+    is_renewable = RENEWABLE_VALUES.get(renewable.strip().lower())
+    if is_renewable is None:
+        errors.append("Redeemable must be Forever or Once")
+
+    if errors:
+        return None, errors
+    return Reward(user_id, text, crumbs, is_renewable), []
+
 
 class CreateShopItem(ui.DesignerModal):
     def __init__(self):
         super().__init__(title="Create A Reward Item")
 
-        self.reward_text = ui.InputText(placeholder=choice(REWARD_TEXT_PLACEHOLDER))
+        self.reward_text = ui.InputText(placeholder=choice(REWARD_TEXT_PLACEHOLDER), max_length=REWARD_TEXT_LENGTH)
         self.add_item(ui.Label("Reward", self.reward_text,
                                description="Something that helps motivate you to complete your goals"))
-        self.cost_text = ui.InputText(placeholder=str(randint(10, 50)), max_length=6)
+        self.cost_text = ui.InputText(placeholder=str(randint(10, 50)), max_length=COST_DIGITS)
         self.add_item(ui.Label("Crumb Cost", self.cost_text,
                                description="How many crumbs do you want to spend to redeem this reward? Bigger rewards should have higher costs."),)
         self.renewable_select = ui.Select(options=[
@@ -47,98 +87,46 @@ class CreateShopItem(ui.DesignerModal):
         ])
         self.add_item(ui.Label("Redeemable", self.renewable_select))
 
+    @timed("create_reward")
     async def callback(self, interaction: Interaction):
-        try:
-            cost = int(self.cost_text.value)
-        except ValueError:
-            cost_error = True
-        else:
-            cost_error = cost <= 0
-
-        if cost_error:
+        r, errors = check_reward(interaction.user.id, self.reward_text.value, self.cost_text.value,
+                                 self.renewable_select.values[0])
+        if errors:
             await interaction.respond(view=ui.DesignerView(await cf.input_error(
-                "Failed To Process Input", ["The cost of the reward must be a positive integer"]
+                "Failed To Process Input", errors
             )), ephemeral=True)
             return
 
-        if self.renewable_select.values[0] == "forever":
-            renewable = True
-        else:
-            renewable = False
-
-        r = Reward(interaction.user.id, self.reward_text.value, cost, renewable)
         await r.create()
 
         await interaction.respond(view=ui.DesignerView(await cf.success(f"Your Reward For **{r.text}** Was Created")), ephemeral=True)
 
 
-class NavButton(ui.Button):
-    def __init__(self, forward: bool):
-        super().__init__(emoji=("▶️" if forward else "◀️"))
-        self.forward = forward
-
-    async def callback(self, interaction: Interaction):
-        if interaction.user.id != self.parent.parent.user_id:
-            await interaction.respond(view=ui.DesignerView(await cf.fail("You cannot change the page")),
-                                      ephemeral=True)
-            return
-        await self.parent.parent.nav(interaction, self.forward)
-
-
 class RewardListPaginator(ui.DesignerView):
-    def __init__(self, rewards: list[Reward], display_name: str, crumbs: float, interaction: Interaction):
-        self.chunks = [rewards[i:min(i + 5, len(rewards))] for i in range(0, len(rewards), 5)]
-        if len(self.chunks) > 1:
-            super().__init__(timeout=300)
-        else:
-            super().__init__(store=False)
-        self.index = 0
-        self.interaction = interaction
-        self.user_id = interaction.user.id
+    """Holds nothing between clicks, the owner and where the pages either side start are in the nav buttons"""
 
-        c = ui.Container(ui.TextDisplay(f"## {display_name}'s Shop\nYou Have **{crumbs:.2f}** to spend"), color=0xfcba03, id=1)
+    def __init__(self, rewards: list[Reward], page: int, pages: int, more: bool, user_id: int, display_name: str,
+                 crumbs: float):
+        super().__init__(store=False, timeout=None)
+        c = ui.Container(ui.TextDisplay(f"## {display_name}'s Shop\nYou Have **{crumbs:.2f}** to spend"), color=0xfcba03)
 
-        for reward in self.chunks[self.index]:
+        for reward in rewards:
             c.add_separator()
             c.add_item(reward.short_display())
 
         self.add_item(c)
 
-        if len(self.chunks) > 1:
-            self.back = NavButton(forward=False)
-            self.back.disabled = True
-            self.page_display = ui.Button(label=f"1/{len(self.chunks)}", disabled=True)
-            self.forward = NavButton(forward=True)
-            self.add_item(ui.ActionRow(self.back, self.page_display, self.forward))
-
-    async def nav(self, interaction: Interaction, forward: bool):
-        self.interaction = interaction
-        if forward:
-            self.index += 1
-        else:
-            self.index -= 1
-
-        self.back.disabled = self.index == 0
-        self.page_display.label = f"{self.index + 1}/{len(self.chunks)}"
-        self.forward.disabled = self.index == len(self.chunks) - 1
-
-        c: ui.Container = self.get_item(1)
-        c.items = c.items[:1]
-        for goal in self.chunks[self.index]:
-            c.add_separator()
-            c.add_item(goal.short_display())
-
-        await interaction.edit(view=self)
-
-    async def on_timeout(self) -> None:
-        self.back.parent.children = []
-        self.back.parent.add_item(ui.Button(label="Refresh", emoji="🔁", custom_id=f"reward_list_refresh::{self.user_id}"))
-        await self.interaction.edit(view=self)
+        if rewards and (page > 0 or more):
+            self.add_item(nav_row("reward_page", user_id, 0, page, pages, (rewards[0].created, rewards[0].id),
+                                  (rewards[-1].created, rewards[-1].id), more))
 
 
 @slash_command(description="Spend Your Crumbs On Rewards")
 async def shop(ctx: ApplicationContext):
-    rewards = await Reward.fetch_user_rewards(ctx.user.id)
+    rewards, total = await asyncio.gather(
+        Reward.fetch_user_rewards_page(ctx.user.id, limit=PAGE_SIZE),
+        Reward.count_user_rewards(ctx.user.id),
+    )
 
     if len(rewards) == 0:
         await ctx.respond(view=ui.DesignerView(
@@ -148,7 +136,9 @@ async def shop(ctx: ApplicationContext):
 
     u = await User.fetch(ctx.user.id)
 
-    await ctx.respond(view=RewardListPaginator(rewards, ctx.user.display_name, u.points, ctx.interaction))
+    pages = max(ceil(total / PAGE_SIZE), 1)
+    await ctx.respond(view=RewardListPaginator(rewards, 0, pages, pages > 1, ctx.user.id, ctx.user.display_name,
+                                               u.points))
 
 
 @slash_command(description="Create A New Reward In The Shop")
@@ -156,44 +146,63 @@ async def create_reward(ctx: ApplicationContext):
     await ctx.send_modal(CreateShopItem())
 
 
-# Handle Interactions Manually Instead Of Using View Callbacks
-async def on_interaction(interaction: Interaction):
-    if interaction.custom_id is None:
-        return
-    if interaction.custom_id.startswith("shop_reward::"):
-        await shop_reward_button(interaction)
-    elif interaction.custom_id.startswith("reward_list_refresh::"):
-        await reward_list_refresh(interaction)
-
-
 async def shop_reward_button(interaction: Interaction):
     reward_id = int(interaction.custom_id.split("::", maxsplit=1)[1])
-    reward = await Reward.fetch(reward_id)
-    if reward is None:
+    redeemed = await Reward.redeem(reward_id, interaction.user.id)
+    if redeemed is None:
         await interaction.respond(view=ui.DesignerView(await cf.fail("Uh Oh! This reward was already claimed!")), ephemeral=True)
         return
 
-    u = await User.fetch(interaction.user.id)
-    if not await u.use_points(reward.cost):
+    if not redeemed["ok"]:
         await interaction.respond(view=ui.DesignerView(await cf.fail("You Do Not Have Enough Crumbs. Complete Goals To Earn More Crumbs")), ephemeral=True)
         return
 
-    if not reward.renewable:
-        await reward.delete()
+    if not redeemed["renewable"]:
         v = ui.DesignerView.from_message(interaction.message)
         button = v.get_item(interaction.custom_id)
         button.disabled = True
         await interaction.edit(view=v)
 
     await interaction.respond(
-        view=ui.DesignerView(await cf.success(f"You redeemed **{reward.text}** for {reward.cost} Crumbs.")),
+        view=ui.DesignerView(await cf.success(f"You redeemed **{redeemed['text']}** for {redeemed['cost']} Crumbs.")),
         ephemeral=True)
 
 
+async def reward_page_button(interaction: Interaction):
+    cursor = PageCursor.parse(interaction.custom_id)
+    if cursor.owner != interaction.user.id:
+        await interaction.respond(view=ui.DesignerView(await cf.fail("You cannot change the page")), ephemeral=True)
+        return
+
+    async def render() -> ui.DesignerView:
+        if cursor.forward:
+            # One extra reward shows if there is a page after this one
+            rewards, u = await asyncio.gather(
+                Reward.fetch_user_rewards_page(cursor.owner, after=cursor.key, limit=PAGE_SIZE + 1),
+                User.fetch(cursor.owner),
+            )
+            more = len(rewards) > PAGE_SIZE
+            rewards = rewards[:PAGE_SIZE]
+        else:
+            rewards, u = await asyncio.gather(
+                Reward.fetch_user_rewards_page(cursor.owner, before=cursor.key, limit=PAGE_SIZE),
+                User.fetch(cursor.owner),
+            )
+            more = True
+        return RewardListPaginator(rewards, cursor.page, cursor.pages, more, cursor.owner,
+                                   interaction.user.display_name, u.points)
+
+    # Clicks on a message before its edit lands carry the same cursor, so they add nothing to that edit
+    await edits.edit(interaction, render, state=interaction.custom_id)
+
+
 async def reward_list_refresh(interaction: Interaction):
     user_id = int(interaction.custom_id.split("::", maxsplit=1)[1])
 
-    rewards = await Reward.fetch_user_rewards(user_id)
+    rewards, total = await asyncio.gather(
+        Reward.fetch_user_rewards_page(user_id, limit=PAGE_SIZE),
+        Reward.count_user_rewards(user_id),
+    )
 
     if len(rewards) == 0:
         await interaction.respond(view=ui.DesignerView(
@@ -203,11 +212,17 @@ async def reward_list_refresh(interaction: Interaction):
 
     u = await User.fetch(user_id)
 
-    await interaction.edit(view=RewardListPaginator(rewards, interaction.user.display_name, u.points, interaction))
+    pages = max(ceil(total / PAGE_SIZE), 1)
+    await interaction.edit(view=RewardListPaginator(rewards, 0, pages, pages > 1, user_id,
+                                                    interaction.user.display_name, u.points))
 
 
 def setup(bot: Bot):
     bot.add_application_command(shop)
     bot.add_application_command(create_reward)
 
-    bot.add_listener(on_interaction)
+    # Handle Interactions Manually Instead Of Using View Callbacks
+    router.add("shop_reward", shop_reward_button)
+    router.add("reward_page", reward_page_button)
+    # Lists sent before paginators were stateless have a refresh button in place of their expired nav buttons
+    router.add("reward_list_refresh", reward_list_refresh)
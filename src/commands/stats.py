@@ -0,0 +1,90 @@
+from discord import Bot, ApplicationContext, slash_command, ui
+
+from models.stats import UserStats
+from models.user import User
+from utils import component_factory as cf
+from utils.cache import cache_stats
+from utils.database import database as db
+from utils.edits import edits
+from utils.metrics import histograms
+from utils.router import router
+
+
+# The text displays of a message can hold 4000 characters between them
+MAX_TEXT_LENGTH = 4000
+# Lines shown from each list, the busiest first
+TOP_LINES = 10
+
+
+def _latency_lines(name: str, label: str) -> list[str]:
+    lines = []
+    for h in sorted((h for h in histograms() if h.name == name), key=lambda h: -h.count):
+        s = h.stats()
+        lines.append(f"`{h.labels[label]}` {s['count']:.0f} calls, p50 {s['p50'] * 1000:.1f}ms, "
+                     f"p99 {s['p99'] * 1000:.1f}ms")
+    return lines
+
+
+def _section(title: str, lines: list[str], max_length: int) -> str:
+    if len(lines) > TOP_LINES:
+        lines = lines[:TOP_LINES] + [f"*And {len(lines) - TOP_LINES} more*"]
+    text = f"### {title}\n" + ("\n".join(lines) if lines else "*Nothing Recorded Yet*")
+    if len(text) > max_length:
+        text = text[:max_length - 6].rsplit("\n", maxsplit=1)[0] + "\n*...*"
+    return text
+
+
+@slash_command(description="Show the bot's latency, database and cache metrics")
+async def bot_stats(ctx: ApplicationContext):
+    if not await ctx.bot.is_owner(ctx.author):
+        await ctx.respond(view=ui.DesignerView(await cf.fail("Only the bot owner can view the bot's stats")),
+                          ephemeral=True)
+        return
+
+    interactions = [f"`{name}` {s['count']:.0f} calls, p50 {s['p50'] * 1000:.1f}ms, p99 {s['p99'] * 1000:.1f}ms, "
+                    f"{s['errors']} errors"
+                    for name, s in sorted(router.stats().items(), key=lambda i: -i[1]["count"]) if s["count"]]
+    pool = db.pool_stats()
+    caches = [f"`{name}` {s['size']}/{s['max_size']}, {s['hit_ratio']:.0%} hits, {s['evictions']} evicted"
+              for name, s in cache_stats().items()]
+    pool_text = f"### Pool\n{pool['held']} held, {pool['idle']} idle, {pool['size']}/{pool['max_size']} open"
+    edits_text = (f"### Paginator Edits\n{edits.sent.value} sent, {edits.saved.value} saved by coalescing "
+                  f"{edits.requested.value} clicks")
+    lists = [("Commands", _latency_lines("command_seconds", "command")), ("Interactions", interactions),
+             ("Queries", _latency_lines("db_query_seconds", "statement")), ("Caches", caches)]
+    # The lists share what the fixed sections leave of the message's text
+    share = (MAX_TEXT_LENGTH - len(pool_text) - len(edits_text)) // len(lists)
+    commands, interactions, queries, caches = (_section(title, lines, share) for title, lines in lists)
+
+    c = ui.Container()
+    c.add_text(commands)
+    c.add_text(interactions)
+    c.add_text(queries)
+    c.add_separator()
+    c.add_text(pool_text)
+    c.add_text(caches)
+    c.add_text(edits_text)
+    await ctx.respond(view=ui.DesignerView(c), ephemeral=True)
+
+
+@slash_command(description="See Your Streak And The Goals You Completed")
+async def stats(ctx: ApplicationContext):
+    u = await User.fetch(ctx.author.id)
+    s = await UserStats.fetch(u.user_id, u.zone)
+    if s.completions == 0:
+        await ctx.respond(view=ui.DesignerView(await cf.general("Complete a goal to start your streak", "Your Stats")),
+                          ephemeral=True)
+        return
+
+    periods = "\n".join(f"**{label}:** {s.periods[period][0]} goals, {s.periods[period][1]:.2f} crumbs"
+                         for period, label in (("day", "Today"), ("week", "This Week"), ("month", "This Month")))
+    await ctx.respond(view=ui.DesignerView(await cf.general(
+        f"**Streak:** {s.current_streak} days (Best {s.best_streak})\n"
+        f"**Completed:** {s.completions} goals, earning {s.crumbs_earned:.2f} crumbs\n" + periods,
+        "Your Stats",
+    )), ephemeral=True)
+
+
+def setup(bot: Bot):
+    bot.add_application_command(bot_stats)
+    bot.add_application_command(stats)
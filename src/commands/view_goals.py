@@ -1,77 +1,43 @@
+import asyncio
+from math import ceil
+
 from discord import Bot, ApplicationContext, slash_command, Interaction, Option, SlashCommand, ui, AllowedMentions
 
 from models.goal import Goal
 from utils import component_factory as cf
+from utils.edits import edits
+from utils.pagination import PageCursor, nav_row
+from utils.router import router
 
 
-class NavButton(ui.Button):
-    def __init__(self, forward: bool):
-        super().__init__(emoji=("▶️" if forward else "◀️"))
-        self.forward = forward
-
-    async def callback(self, interaction: Interaction):
-        if interaction.user.id != self.parent.parent.user_id:
-            await interaction.respond(view=ui.DesignerView(await cf.fail("You cannot change the page")),
-                                      ephemeral=True)
-            return
-        await self.parent.parent.nav(interaction, self.forward)
+PAGE_SIZE = 5
 
 
 class GoalListPaginator(ui.DesignerView):
-    def __init__(self, goals: list[Goal], display_name: str, interaction: Interaction):
-        self.chunks = [goals[i:min(i + 5, len(goals))] for i in range(0, len(goals), 5)]
-        if len(self.chunks) > 1:
-            super().__init__(timeout=300)
-        else:
-            super().__init__(store=False)
-        self.index = 0
-        self.interaction = interaction
-        self.user_id = interaction.user.id
+    """Holds nothing between clicks, the owner and where the pages either side start are in the nav buttons"""
 
-        c = ui.Container(ui.TextDisplay(f"## {display_name}'s Goals"), color=0x5865F2, id=1)
+    def __init__(self, goals: list[Goal], page: int, pages: int, more: bool, completed: bool, user_id: int,
+                 display_name: str):
+        super().__init__(store=False, timeout=None)
+        c = ui.Container(ui.TextDisplay(f"## {display_name}'s Goals"), color=0x5865F2)
 
-        for goal in self.chunks[self.index]:
+        for goal in goals:
             c.add_separator()
             c.add_item(goal.short_display())
 
         self.add_item(c)
 
-        if len(self.chunks) > 1:
-            self.back = NavButton(forward=False)
-            self.back.disabled = True
-            self.page_display = ui.Button(label=f"1/{len(self.chunks)}", disabled=True)
-            self.forward = NavButton(forward=True)
-            self.add_item(ui.ActionRow(self.back, self.page_display, self.forward))
-
-    async def nav(self, interaction: Interaction, forward: bool):
-        self.interaction = interaction
-        if forward:
-            self.index += 1
-        else:
-            self.index -= 1
-
-        self.back.disabled = self.index == 0
-        self.page_display.label = f"{self.index + 1}/{len(self.chunks)}"
-        self.forward.disabled = self.index == len(self.chunks) - 1
-
-        c: ui.Container = self.get_item(1)
-        c.items = c.items[:1]
-        for goal in self.chunks[self.index]:
-            c.add_separator()
-            c.add_item(goal.short_display())
-
-        await interaction.edit(view=self)
-
-    async def on_timeout(self) -> None:
-        self.back.parent.children = []
-        self.back.parent.add_item(ui.Button(label="Refresh", emoji="🔁", custom_id=f"goal_list_refresh::{self.user_id}"))
-        await self.interaction.edit(view=self)
-
+        if goals and (page > 0 or more):
+            self.add_item(nav_row("goal_page", user_id, int(completed), page, pages,
+                                  (goals[0].created, goals[0].id), (goals[-1].created, goals[-1].id), more))
 
 
 @slash_command(description="List All Of Your Goals")
 async def goal_list(ctx: ApplicationContext, completed: Option(bool, description="Include Completed Goals", default=False)):
-    goals = await Goal.fetch_user_goals(ctx.author.id, completed)
+    goals, total = await asyncio.gather(
+        Goal.fetch_user_goals_page(ctx.author.id, completed, limit=PAGE_SIZE),
+        Goal.count_user_goals(ctx.author.id, completed),
+    )
 
     if len(goals) == 0:
         if completed:
@@ -81,17 +47,9 @@ async def goal_list(ctx: ApplicationContext, completed: Option(bool, description
             await ctx.respond(view=ui.DesignerView(await cf.fail(f"You dont have any uncompleted goals. Use {ctx.bot.get_command("goal", None, SlashCommand).mention} to get another.")), ephemeral=True)
             return
 
-    await ctx.respond(view=GoalListPaginator(goals, ctx.author.display_name, ctx.interaction))
-
-
-# Handle Interactions Manually Instead Of Using View Callbacks
-async def on_interaction(interaction: Interaction):
-    if interaction.custom_id is None:
-        return
-    if interaction.custom_id.startswith("view_goal::"):
-        await view_goal_button(interaction)
-    elif interaction.custom_id.startswith("goal_list_refresh::"):
-        await view_goal_list_refresh_button(interaction)
+    pages = max(ceil(total / PAGE_SIZE), 1)
+    await ctx.respond(view=GoalListPaginator(goals, 0, pages, pages > 1, completed, ctx.author.id,
+                                             ctx.author.display_name))
 
 
 async def view_goal_button(interaction: Interaction) -> None:
@@ -99,17 +57,50 @@ async def view_goal_button(interaction: Interaction) -> None:
     await interaction.respond(view=g.display(), allowed_mentions=AllowedMentions.none())
 
 
+async def goal_page_button(interaction: Interaction) -> None:
+    cursor = PageCursor.parse(interaction.custom_id)
+    if cursor.owner != interaction.user.id:
+        await interaction.respond(view=ui.DesignerView(await cf.fail("You cannot change the page")), ephemeral=True)
+        return
+
+    async def render() -> ui.DesignerView:
+        if cursor.forward:
+            # One extra goal shows if there is a page after this one
+            goals = await Goal.fetch_user_goals_page(cursor.owner, bool(cursor.flag), after=cursor.key,
+                                                     limit=PAGE_SIZE + 1)
+            more = len(goals) > PAGE_SIZE
+            goals = goals[:PAGE_SIZE]
+        else:
+            goals = await Goal.fetch_user_goals_page(cursor.owner, bool(cursor.flag), before=cursor.key,
+                                                     limit=PAGE_SIZE)
+            more = True
+        return GoalListPaginator(goals, cursor.page, cursor.pages, more, bool(cursor.flag), cursor.owner,
+                                 interaction.user.display_name)
+
+    # Clicks on a message before its edit lands carry the same cursor, so they add nothing to that edit
+    await edits.edit(interaction, render, state=interaction.custom_id)
+
+
 async def view_goal_list_refresh_button(interaction: Interaction) -> None:
     user_id = int(interaction.custom_id.split("::")[1])
     if user_id != interaction.user.id:
         await interaction.respond(view=ui.DesignerView(await cf.fail("You cannot refresh someone else's goal list")),
                                   ephemeral=True)
         return
-    goals = await Goal.fetch_user_goals(interaction.user.id, False)
-    await interaction.edit(view=GoalListPaginator(goals, interaction.user.display_name, interaction))
+    goals, total = await asyncio.gather(
+        Goal.fetch_user_goals_page(interaction.user.id, False, limit=PAGE_SIZE),
+        Goal.count_user_goals(interaction.user.id, False),
+    )
+    pages = max(ceil(total / PAGE_SIZE), 1)
+    await interaction.edit(view=GoalListPaginator(goals, 0, pages, pages > 1, False, interaction.user.id,
+                                                  interaction.user.display_name))
 
 
 def setup(bot: Bot):
     bot.add_application_command(goal_list)
 
-    bot.add_listener(on_interaction)
+    # Handle Interactions Manually Instead Of Using View Callbacks
+    router.add("view_goal", view_goal_button)
+    router.add("goal_page", goal_page_button)
+    # Lists sent before paginators were stateless have a refresh button in place of their expired nav buttons
+    router.add("goal_list_refresh", view_goal_list_refresh_button)
@@ -1,13 +1,86 @@
+import asyncio
+import logging
+import signal
 from os import environ
+from time import perf_counter
 
 import discord as pycord
 from discord import ApplicationContext
 from dotenv import load_dotenv
 
+from models import ledger
+from models.goal import Goal
+from models.user import User
+from utils.database import database as db
+from utils.edits import edits
+from utils.instrumentation import instrument_bot, instrument_database, serve
+from utils.invalidation import invalidation
+from utils.migrations import migrate
+from utils.router import router
+
 
 load_dotenv()
+logging.basicConfig(level=logging.INFO)
+log = logging.getLogger("meowtivation")
+
+
+async def warm_up() -> None:
+    """
+    Apply pending migrations, open the pool and load recently active users and their open goals so the first
+    interactions after a deploy do not pay for it. The budgets are set with `WARM_USERS`, `WARM_GOALS` and `WARM_HOURS`.
+    """
+    start = perf_counter()
+    applied = await migrate()
+    if applied:
+        log.info("Startup: applied migrations %s in %.3fs", ", ".join(applied), perf_counter() - start)
+    start = perf_counter()
+    # Opening the pool opens its minimum connections and sets up their codecs. Each statement is parsed on its first
+    # use on a connection and kept in that connection's statement cache.
+    await db.connect()
+    pool_done = perf_counter()
+    log.info("Startup: opened database pool in %.3fs", pool_done - start)
+
+    user_ids = await ledger.recent_users(int(environ.get("WARM_USERS", 500)), int(environ.get("WARM_HOURS", 48)))
+    users = await User.preload(user_ids) if user_ids else 0
+    users_done = perf_counter()
+    log.info("Startup: preloaded %d users in %.3fs", users, users_done - pool_done)
+
+    goals = await Goal.preload_user_goals(user_ids, int(environ.get("WARM_GOALS", 2000))) if user_ids else 0
+    log.info("Startup: preloaded %d goals in %.3fs", goals, perf_counter() - users_done)
+
 
-bot = pycord.Bot()
+def shard_options() -> dict:
+    """
+    Run the shards in `SHARD_IDS`, a comma separated list, out of `SHARD_COUNT` shards in this process so the bot can be
+    split across several processes. Without them one process runs every shard.
+    """
+    if "SHARD_IDS" not in environ:
+        return {}
+    shard_ids = [int(i) for i in environ["SHARD_IDS"].split(",")]
+    # Every process has the same commands, only one of them needs to sync them
+    return {"shard_count": int(environ["SHARD_COUNT"]), "shard_ids": shard_ids, "auto_sync_commands": 0 in shard_ids}
+
+
+class Meowtivation(pycord.AutoShardedBot):
+    async def start(self, token: str, *, reconnect: bool = True) -> None:
+        if self.shard_ids is not None:
+            # Other processes write the same rows, listen before anything is cached so no invalidation is missed
+            await invalidation.start()
+        # Warm up before connecting to the gateway so the bot is not ready until it is warm
+        await warm_up()
+        if "METRICS_PORT" in environ:
+            await serve(int(environ["METRICS_PORT"]))
+        if db.profiler is not None and hasattr(signal, "SIGUSR1"):
+            # `kill -USR1 <pid>` writes the query profile
+            path = environ.get("DB_PROFILE_DUMP", "query_profile.json")
+            asyncio.get_running_loop().add_signal_handler(signal.SIGUSR1, db.profiler.dump, path)
+        await super().start(token, reconnect=reconnect)
+
+
+bot = Meowtivation(**shard_options())
+instrument_bot(bot)
+instrument_database(db)
+edits.rate_limits.install(bot)
 
 
 @bot.event
@@ -41,5 +114,11 @@ bot.load_extension("commands.create_goal")
 bot.load_extension("commands.view_goals")
 bot.load_extension("commands.shop")
 bot.load_extension("commands.goal_repeat")
+bot.load_extension("commands.stats")
+bot.load_extension("commands.bulk_import")
+bot.load_extension("commands.export")
+
+# One listener dispatches every component interaction to the handlers the extensions registered
+bot.add_listener(router.on_interaction)
 
 bot.run(environ["DISCORD_BOT_TOKEN"])
@@ -0,0 +1,73 @@
+-- The tables the models use. Databases that were set up by hand before migrations existed already have some of this,
+-- so every change only applies what is missing.
+
+CREATE TABLE IF NOT EXISTS discord_user (
+    id           bigint PRIMARY KEY,
+    points       double precision NOT NULL DEFAULT 0,
+    share_points integer NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS goal (
+    id           bigint GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    discord_user bigint NOT NULL REFERENCES discord_user (id),
+    text         text NOT NULL,
+    reward       integer NOT NULL,
+    completed    boolean NOT NULL DEFAULT false,
+    repeat       smallint NOT NULL DEFAULT 0,
+    reset_at     timestamptz,
+    created      timestamptz NOT NULL DEFAULT now()
+);
+
+CREATE TABLE IF NOT EXISTS reward (
+    id           bigint GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    discord_user bigint NOT NULL REFERENCES discord_user (id),
+    text         text NOT NULL,
+    cost         integer NOT NULL,
+    renewable    boolean NOT NULL DEFAULT true,
+    created      timestamptz NOT NULL DEFAULT now()
+);
+
+CREATE TABLE IF NOT EXISTS incentive (
+    goal   bigint NOT NULL REFERENCES goal (id) ON DELETE CASCADE,
+    sender bigint NOT NULL REFERENCES discord_user (id)
+);
+
+CREATE TABLE IF NOT EXISTS point_transaction (
+    id           bigint GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    discord_user bigint NOT NULL REFERENCES discord_user (id),
+    points       double precision NOT NULL,
+    share_points integer NOT NULL,
+    reason       text,
+    created      timestamptz NOT NULL DEFAULT now()
+);
+
+-- Columns added after the first hand made tables
+ALTER TABLE goal ADD COLUMN IF NOT EXISTS reset_at timestamptz;
+ALTER TABLE goal ADD COLUMN IF NOT EXISTS created timestamptz NOT NULL DEFAULT now();
+ALTER TABLE reward ADD COLUMN IF NOT EXISTS created timestamptz NOT NULL DEFAULT now();
+
+-- ON CONFLICT (id) in ENSURE_USER needs the primary key, and the models rely on the foreign keys to reject rows owned
+-- by a user that does not exist
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conrelid = 'discord_user'::regclass AND contype = 'p') THEN
+        ALTER TABLE discord_user ADD PRIMARY KEY (id);
+    END IF;
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conrelid = 'goal'::regclass AND contype = 'p') THEN
+        ALTER TABLE goal ADD PRIMARY KEY (id);
+    END IF;
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conrelid = 'reward'::regclass AND contype = 'p') THEN
+        ALTER TABLE reward ADD PRIMARY KEY (id);
+    END IF;
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conrelid = 'goal'::regclass AND contype = 'f') THEN
+        ALTER TABLE goal ADD FOREIGN KEY (discord_user) REFERENCES discord_user (id);
+    END IF;
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conrelid = 'reward'::regclass AND contype = 'f') THEN
+        ALTER TABLE reward ADD FOREIGN KEY (discord_user) REFERENCES discord_user (id);
+    END IF;
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conrelid = 'incentive'::regclass AND contype = 'f') THEN
+        ALTER TABLE incentive ADD FOREIGN KEY (goal) REFERENCES goal (id) ON DELETE CASCADE;
+        ALTER TABLE incentive ADD FOREIGN KEY (sender) REFERENCES discord_user (id);
+    END IF;
+END $$;
+
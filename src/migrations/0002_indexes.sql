@@ -0,0 +1,18 @@
+-- Indexes for the queries in models/ and commands/goal_repeat.py. benchmarks/plan_check.py checks each registered
+-- statement uses one.
+
+-- goal_fetch_user_page(_after) and goal_count_user, the trailing id makes the (created, id) keyset an index range
+CREATE INDEX IF NOT EXISTS goal_discord_user_created_idx ON goal (discord_user, created, id);
+-- goal_fetch_user_open_page(_after), goal_count_user_open and goal_preload_users_open
+CREATE INDEX IF NOT EXISTS goal_discord_user_completed_created_idx ON goal (discord_user, completed, created, id);
+-- goal_reset_due and goal_backfill_reset_at only look at completed goals, which are the ones with a reset_at
+CREATE INDEX IF NOT EXISTS goal_repeat_reset_at_idx ON goal (repeat, reset_at) WHERE completed;
+
+-- reward_fetch_user_page(_after) and reward_count_user
+CREATE INDEX IF NOT EXISTS reward_discord_user_created_idx ON reward (discord_user, created, id);
+
+-- The senders loaded with every goal, incentive_fetch and incentive_fetch_goal
+CREATE INDEX IF NOT EXISTS incentive_goal_sender_idx ON incentive (goal, sender);
+
+-- ledger_recent_users
+CREATE INDEX IF NOT EXISTS point_transaction_created_idx ON point_transaction (created);
@@ -0,0 +1,12 @@
+-- Goals keep a count of their incentives and the first distinct senders, so showing or completing a goal does not
+-- read its incentive rows. incentive_create keeps both up to date in the statement that inserts the incentive.
+-- Incentives do not record when they were added, so for existing incentives the backfill keeps the ten lowest distinct
+-- sender ids instead of the first ten senders.
+ALTER TABLE goal ADD COLUMN IF NOT EXISTS incentive_count integer NOT NULL DEFAULT 0;
+ALTER TABLE goal ADD COLUMN IF NOT EXISTS senders bigint[] NOT NULL DEFAULT '{}';
+
+UPDATE goal SET incentive_count = i.count, senders = i.senders
+FROM (
+    SELECT goal, count(*) AS count, (array_agg(DISTINCT sender))[1:10] AS senders FROM incentive GROUP BY goal
+) AS i
+WHERE goal.id = i.goal;
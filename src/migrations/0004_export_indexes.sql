@@ -0,0 +1,6 @@
+-- The personal data export reads the incentives a user gave and their ledger history
+
+-- export_incentives
+CREATE INDEX IF NOT EXISTS incentive_sender_idx ON incentive (sender);
+-- export_transactions
+CREATE INDEX IF NOT EXISTS point_transaction_discord_user_created_idx ON point_transaction (discord_user, created, id);
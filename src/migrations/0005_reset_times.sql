@@ -0,0 +1,8 @@
+-- Repeating goals reset at a time of day each user picks, in their timezone, instead of all at midnight UTC.
+-- reset_minute is minutes after local midnight.
+ALTER TABLE discord_user ADD COLUMN IF NOT EXISTS timezone text NOT NULL DEFAULT 'UTC';
+ALTER TABLE discord_user ADD COLUMN IF NOT EXISTS reset_minute smallint NOT NULL DEFAULT 0
+    CHECK (reset_minute >= 0 AND reset_minute < 1440);
+
+-- goal_reset_due and goal_next_reset find due goals of every repeat type by reset_at alone
+CREATE INDEX IF NOT EXISTS goal_reset_at_idx ON goal (reset_at) WHERE completed;
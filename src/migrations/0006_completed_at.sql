@@ -0,0 +1,19 @@
+-- Goals record when they were completed instead of a completed flag that a task had to clear when repeating goals
+-- reset. A goal is completed while completed_at is set and its reset_at, if it has one, has not passed yet.
+
+ALTER TABLE goal ADD COLUMN IF NOT EXISTS completed_at timestamptz;
+
+-- Completed repeating goals from before reset_at was maintained reopen at the next midnight UTC, like they used to
+UPDATE goal SET reset_at = CASE repeat
+        WHEN 1 THEN date_trunc('day', now(), 'UTC') + interval '1 day'
+        WHEN 2 THEN date_trunc('week', now(), 'UTC') + interval '1 week'
+        WHEN 3 THEN date_trunc('month', now(), 'UTC') + interval '1 month'
+        WHEN 4 THEN date_trunc('year', now(), 'UTC') + interval '1 year'
+    END
+WHERE completed AND repeat > 0 AND reset_at IS NULL;
+
+-- When they were completed is not known, only that it was before now
+UPDATE goal SET completed_at = now() WHERE completed AND completed_at IS NULL;
+
+-- Drops the indexes on completed with it
+ALTER TABLE goal DROP COLUMN IF EXISTS completed;
@@ -0,0 +1,38 @@
+-- Every completion of a goal, and stats the statement completing a goal keeps up to date from it so reading them never
+-- scans the history. Completions backfilled from the ledger have no goal, it did not record which one was completed.
+CREATE TABLE IF NOT EXISTS goal_completion (
+    id           bigint GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    goal         bigint REFERENCES goal (id) ON DELETE SET NULL,
+    discord_user bigint NOT NULL REFERENCES discord_user (id),
+    crumbs       double precision NOT NULL,
+    completed    timestamptz NOT NULL DEFAULT now()
+);
+CREATE INDEX IF NOT EXISTS goal_completion_discord_user_completed_idx ON goal_completion (discord_user, completed, id);
+CREATE INDEX IF NOT EXISTS goal_completion_goal_idx ON goal_completion (goal);
+
+-- A goal's streak is the periods in a row it was completed in, it carries on if it is completed before streak_until
+ALTER TABLE goal ADD COLUMN IF NOT EXISTS completions integer NOT NULL DEFAULT 0;
+ALTER TABLE goal ADD COLUMN IF NOT EXISTS crumbs_earned double precision NOT NULL DEFAULT 0;
+ALTER TABLE goal ADD COLUMN IF NOT EXISTS current_streak integer NOT NULL DEFAULT 0;
+ALTER TABLE goal ADD COLUMN IF NOT EXISTS best_streak integer NOT NULL DEFAULT 0;
+ALTER TABLE goal ADD COLUMN IF NOT EXISTS streak_until timestamptz;
+
+-- A user's streak is the days in a row, in their timezone, they completed a goal on. last_day is the latest of them.
+CREATE TABLE IF NOT EXISTS user_stats (
+    discord_user   bigint PRIMARY KEY REFERENCES discord_user (id),
+    completions    integer NOT NULL,
+    crumbs_earned  double precision NOT NULL,
+    current_streak integer NOT NULL,
+    best_streak    integer NOT NULL,
+    last_day       date NOT NULL
+);
+
+-- Completions in each day, week starting on Monday and month, by the user's local date
+CREATE TABLE IF NOT EXISTS user_period_stats (
+    discord_user bigint NOT NULL REFERENCES discord_user (id),
+    period       text NOT NULL CHECK (period IN ('day', 'week', 'month')),
+    start        date NOT NULL,
+    completions  integer NOT NULL,
+    crumbs       double precision NOT NULL,
+    PRIMARY KEY (discord_user, period, start)
+);
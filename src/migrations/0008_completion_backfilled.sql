@@ -0,0 +1,4 @@
+-- Completions loaded from the ledger by the backfill are marked, a goal being deleted also leaves a completion without
+-- a goal so that can not tell them apart
+ALTER TABLE goal_completion ADD COLUMN IF NOT EXISTS backfilled boolean NOT NULL DEFAULT false;
+CREATE INDEX IF NOT EXISTS goal_completion_backfilled_idx ON goal_completion (completed) WHERE backfilled;
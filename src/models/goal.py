@@ -1,13 +1,94 @@
+from datetime import date, datetime, time, timedelta, tzinfo, UTC
 from enum import Enum
 from typing import Self
 from textwrap import dedent
 
-from asyncpg import ForeignKeyViolationError, Record
+from asyncpg import Record
 from discord import ui, ButtonStyle
 
-from models.user import User
+from models.stats import PERIODS, period_starts
+from models.user import User, ENSURE_USER, CREATE_USER
+from utils.cache import ModelCache, next_version, renders
 from utils.database import database as db
-from models.incentive import Incentive
+from utils.invalidation import invalidation
+
+
+# The incentive count and sender summary are kept on the goal, so incentive rows are only read for the full list
+GOAL_COLUMNS = "id, discord_user, text, reward, completed_at, repeat, reset_at, created, incentive_count, senders, " \
+               "completions, crumbs_earned, current_streak, best_streak, streak_until"
+
+CREATE_GOAL = db.statement("goal_create", ENSURE_USER +
+                           "INSERT INTO goal (discord_user, text, reward, repeat) VALUES ($1, $2, $3, $4) RETURNING id;")
+UPDATE_GOAL = db.statement("goal_update", "UPDATE goal SET completed_at=$2, text=$3, reward=$4, repeat=$5, reset_at=$6 "
+                                          "WHERE id=$1;")
+# Completes the goal $1 if it is open, records it, updates the stats in models.stats and pays the owner $4 crumbs and a
+# chocolate nibble like models.ledger.CREDIT, in one statement so the stats never count a reward that was not paid.
+# $5 is the goal's new streak and $9 when it ends, $6 the owner's local date and $7 and $8 the periods that date is in.
+COMPLETE_GOAL = db.statement("goal_complete", """
+    WITH g AS (
+        UPDATE goal SET completed_at=$2, reset_at=$3, completions=completions + 1, crumbs_earned=crumbs_earned + $4,
+                        current_streak=$5, best_streak=greatest(best_streak, $5), streak_until=$9
+        WHERE id=$1 AND (completed_at IS NULL OR reset_at <= $2)
+        RETURNING discord_user, completions, crumbs_earned, best_streak
+    ), completion AS (
+        INSERT INTO goal_completion (goal, discord_user, crumbs, completed) SELECT $1, discord_user, $4, $2 FROM g
+    ), stats AS (
+        INSERT INTO user_stats AS s (discord_user, completions, crumbs_earned, current_streak, best_streak, last_day)
+        SELECT discord_user, 1, $4, 1, 1, $6::date FROM g
+        ON CONFLICT (discord_user) DO UPDATE SET
+            completions = s.completions + 1,
+            crumbs_earned = s.crumbs_earned + $4,
+            current_streak = CASE WHEN s.last_day >= $6::date THEN s.current_streak
+                                  WHEN s.last_day = $6::date - 1 THEN s.current_streak + 1 ELSE 1 END,
+            best_streak = greatest(s.best_streak, CASE WHEN s.last_day >= $6::date THEN s.current_streak
+                                                       WHEN s.last_day = $6::date - 1 THEN s.current_streak + 1 ELSE 1 END),
+            last_day = greatest(s.last_day, $6::date)
+    ), periods AS (
+        INSERT INTO user_period_stats AS p (discord_user, period, start, completions, crumbs)
+        SELECT g.discord_user, period, start, 1, $4 FROM g, unnest($7::text[], $8::date[]) AS periods(period, start)
+        ON CONFLICT (discord_user, period, start) DO UPDATE SET completions = p.completions + 1, crumbs = p.crumbs + $4
+    ), u AS (
+        UPDATE discord_user SET points=points + $4, share_points=share_points + 1 FROM g WHERE id=g.discord_user
+        RETURNING points, share_points
+    ), t AS (
+        INSERT INTO point_transaction (discord_user, points, share_points, reason)
+        SELECT discord_user, $4, 1, 'goal_complete' FROM g
+    )
+    SELECT g.completions, g.crumbs_earned, g.best_streak, u.points, u.share_points FROM g, u;
+""")
+FETCH_GOAL = db.statement("goal_fetch", f"SELECT {GOAL_COLUMNS} FROM goal WHERE id=$1")
+# Pages are keyset paginated on (created, id), a page after the first starts after the key of the previous page's last goal.
+# Open goals were never completed or have passed their reset, the same check as Goal.completed.
+FETCH_USER_GOALS_PAGE = db.statement("goal_fetch_user_page", f"SELECT {GOAL_COLUMNS} FROM goal "
+                                                             "WHERE discord_user=$1 ORDER BY created, id LIMIT $2;")
+FETCH_USER_GOALS_PAGE_AFTER = db.statement("goal_fetch_user_page_after", f"SELECT {GOAL_COLUMNS} FROM goal "
+                                                                         "WHERE discord_user=$1 AND (created, id) > ($3, $4) "
+                                                                         "ORDER BY created, id LIMIT $2;")
+FETCH_USER_OPEN_GOALS_PAGE = db.statement("goal_fetch_user_open_page", f"SELECT {GOAL_COLUMNS} FROM goal "
+                                                                       "WHERE discord_user=$1 AND (completed_at IS NULL OR reset_at <= now()) "
+                                                                       "ORDER BY created, id LIMIT $2;")
+FETCH_USER_OPEN_GOALS_PAGE_AFTER = db.statement("goal_fetch_user_open_page_after",
+                                                f"SELECT {GOAL_COLUMNS} FROM goal "
+                                                "WHERE discord_user=$1 AND (completed_at IS NULL OR reset_at <= now()) AND (created, id) > ($3, $4) "
+                                                "ORDER BY created, id LIMIT $2;")
+# The page before a key is read backwards from the key and reversed
+FETCH_USER_GOALS_PAGE_BEFORE = db.statement("goal_fetch_user_page_before",
+                                            f"SELECT {GOAL_COLUMNS} FROM goal "
+                                            "WHERE discord_user=$1 AND (created, id) < ($3, $4) "
+                                            "ORDER BY created DESC, id DESC LIMIT $2;")
+FETCH_USER_OPEN_GOALS_PAGE_BEFORE = db.statement("goal_fetch_user_open_page_before",
+                                                 f"SELECT {GOAL_COLUMNS} FROM goal "
+                                                 "WHERE discord_user=$1 AND (completed_at IS NULL OR reset_at <= now()) AND (created, id) < ($3, $4) "
+                                                 "ORDER BY created DESC, id DESC LIMIT $2;")
+PRELOAD_USERS_OPEN_GOALS = db.statement("goal_preload_users_open",
+                                       f"SELECT {GOAL_COLUMNS} FROM goal "
+                                       "WHERE discord_user = ANY($1::bigint[]) AND (completed_at IS NULL OR reset_at <= now()) "
+                                       "ORDER BY created DESC LIMIT $2;")
+# Imports are copied in, created keeps its default and completed_at stays null
+COPY_COLUMNS = ("discord_user", "text", "reward", "repeat")
+COUNT_USER_GOALS = db.statement("goal_count_user", "SELECT count(*) FROM goal WHERE discord_user=$1;")
+COUNT_USER_OPEN_GOALS = db.statement("goal_count_user_open",
+                                     "SELECT count(*) FROM goal WHERE discord_user=$1 AND (completed_at IS NULL OR reset_at <= now());")
 
 
 class RepeatType(Enum):
@@ -21,17 +102,53 @@ class RepeatType(Enum):
         if self == RepeatType.NEVER:
             return "Never"
         elif self == RepeatType.DAILY:
-            return "Daily At Midnight UTC"
+            return "Daily"
         elif self == RepeatType.WEEKLY:
-            return "Weekly On Mondays At Midnight UTC"
+            return "Weekly On Mondays"
+        elif self == RepeatType.MONTHLY:
+            return "Monthly On The 1st"
+        elif self == RepeatType.YEARLY:
+            return "Yearly On January 1st"
+
+    def _period_start(self, day: date) -> date:
+        if self == RepeatType.WEEKLY:
+            return day - timedelta(days=day.weekday())
+        elif self == RepeatType.MONTHLY:
+            return day.replace(day=1)
+        elif self == RepeatType.YEARLY:
+            return day.replace(month=1, day=1)
+        return day
+
+    def _next_period(self, start: date) -> date:
+        if self == RepeatType.WEEKLY:
+            return start + timedelta(days=7)
         elif self == RepeatType.MONTHLY:
-            return "Monthly On The 1st At Midnight UTC"
+            if start.month == 12:
+                return start.replace(year=start.year + 1, month=1)
+            return start.replace(month=start.month + 1)
         elif self == RepeatType.YEARLY:
-            return "Yearly On January 1st At Midnight UTC"
+            return start.replace(year=start.year + 1)
+        return start + timedelta(days=1)
+
+    def next_reset(self, after: datetime, zone: tzinfo = UTC, minute: int = 0) -> datetime | None:
+        """
+        :param zone: The owner's timezone, periods start at their local midnight
+        :param minute: Minutes after the start of a period the reset happens
+        :returns The first reset strictly after `after` in UTC, or None if the goal never repeats
+        """
+        if self == RepeatType.NEVER:
+            return None
+        start = self._period_start(after.astimezone(zone).date())
+        # Wall clock arithmetic, so the reset stays at the same local time across daylight saving changes
+        reset = (datetime.combine(start, time(), zone) + timedelta(minutes=minute)).astimezone(UTC)
+        if reset <= after:
+            reset = (datetime.combine(self._next_period(start), time(), zone) +
+                     timedelta(minutes=minute)).astimezone(UTC)
+        return reset
 
 
 class Goal:
-    _cache: dict[int, Self] = {}
+    _cache: ModelCache = ModelCache("goal", max_size=4096)
 
     def __init__(self, user: int, text: str, repeat: RepeatType, reward: int):
         self.user = user
@@ -39,20 +156,68 @@ class Goal:
         self.repeat = repeat
         self.reward = reward
 
-        self.completed = False
-        self.reset_at = None
+        self.completed_at: datetime | None = None
+        # When a completed repeating goal reopens, set when it is completed from the owner's reset time
+        self.reset_at: datetime | None = None
         self.id = None
         self.created = None
 
-        self.incentives: list[Incentive] = []
+        self.incentive_count = 0
+        # Up to MAX_SENDERS of the distinct users who added an incentive, in the order they first did. Goals with
+        # incentives from before the summary was kept start with the lowest sender ids, see migration 0003.
+        self.senders: list[int] = []
 
-    def display(self) -> ui.DesignerView:
+        self.completions = 0
+        self.crumbs_earned = 0.0
+        self.best_streak = 0
+        # The streak carries on if the goal is completed again before streak_until, the end of the period after the
+        # one it was last completed in
+        self._current_streak = 0
+        self.streak_until: datetime | None = None
+
+        # Changes whenever something shown by display or short_display changes
+        self.version = next_version()
+
+    @property
+    def completed(self) -> bool:
+        """Evaluated when it is read, so a repeating goal reopens at its reset without anything writing to it"""
+        return self.completed_at is not None and (self.reset_at is None or datetime.now(UTC) < self.reset_at)
+
+    @property
+    def current_streak(self) -> int:
+        if self.streak_until is None or datetime.now(UTC) >= self.streak_until:
+            return 0
+        return self._current_streak
+
+    def bump_version(self) -> None:
+        self.version = next_version()
+
+    def set_incentives(self, count: int, senders: list[int]) -> None:
+        self.incentive_count = count
+        self.senders = senders
+        self.bump_version()
+
+    def _render_display(self) -> tuple[str, str | None]:
         output = dedent(f"""\
             ## {"You Did It" if self.completed else "You Got This"} <@{self.user}>!
             **Goal:** {self.text}
-            **Repeat:** {self.repeat.display()}
-            **Reward:** {self.reward} {f"(+{0.1 * self.reward * len(self.incentives):.2f})" if len(self.incentives) > 0 else ""} Crumbs
+            **Repeat:** {self.repeat.display()}{f" (Reopens <t:{int(self.reset_at.timestamp())}:R>)" if self.completed and self.reset_at else ""}
+            **Reward:** {self.reward} {f"(+{0.1 * self.reward * self.incentive_count:.2f})" if self.incentive_count > 0 else ""} Crumbs
         """)
+        if self.repeat != RepeatType.NEVER and self.completions > 0:
+            output += f"**Streak:** {self.current_streak} (Best {self.best_streak}), Completed {self.completions} Times\n"
+        boosts = None
+        if self.incentive_count > 0:
+            boosts = (f"These users gave a little boost because they want to see <@{self.user}> succeed!\n" +
+                      "\n".join(["<@"+str(sender)+"> Added a chocolate nibble to the reward" for sender in self.senders]))
+            if self.incentive_count > len(self.senders):
+                boosts += f"\n*And {self.incentive_count - len(self.senders)} more chocolate nibbles*"
+        return output, boosts
+
+    def display(self) -> ui.DesignerView:
+        # Reopening and the streak ending do not change the version, so they are part of it
+        output, boosts = renders.render(("goal", self.id), (self.version, self.completed, self.current_streak),
+                                        self._render_display)
 
         v = ui.DesignerView(
             ui.Container(
@@ -65,20 +230,25 @@ class Goal:
             ),
         )
 
-        if len(self.incentives) > 0:
-            c = ui.Container(
-                ui.TextDisplay(f"These users gave a little boost because they want to see <@{self.user}> succeed!\n" + "\n".join(["<@"+str(i.sender)+"> Added a chocolate nibble to the reward" for i in self.incentives]))
-            )
+        if boosts is not None:
+            c = ui.Container(ui.TextDisplay(boosts))
+            if self.incentive_count > len(self.senders):
+                # Only the first senders are kept on the goal, the rest are read when asked for
+                c.add_item(ui.ActionRow(ui.Button(label="See Everyone", style=ButtonStyle.secondary,
+                                                  custom_id=f"goal_incentives::{self.id}")))
             v.add_item(c)
         return v
 
-    def short_display(self) -> ui.Section:
-        output = dedent(f"""\
+    def _render_short_display(self) -> str:
+        return dedent(f"""\
             ### {"<:cookie_star:1449975179659968626> Completed: " if self.completed else ""} {self.text}
             {"**Repeat:** " + self.repeat.display() if self.repeat != RepeatType.NEVER else ""}
             *Gives {self.reward} <:cookie_star:1449975179659968626> when completed*
         """)
 
+    def short_display(self) -> ui.Section:
+        output = renders.render(("goal_short", self.id), (self.version, self.completed), self._render_short_display)
+
         s = ui.Section(
             ui.TextDisplay(output),
             accessory=ui.Button(label="View", style=ButtonStyle.primary, custom_id="view_goal::" + str(self.id), id=self.id)
@@ -86,70 +256,146 @@ class Goal:
         return s
 
     async def create(self) -> None:
-        sql = ("INSERT INTO goal (discord_user, text, reward, completed, repeat, reset_at) "
-               "VALUES ($1, $2, $3, $4, $5, $6) RETURNING id;")
-        sql_vars = (self.user, self.text, self.reward, False, self.repeat.value, None)
-        try:
-            self.id = await db.fetchval(sql, *sql_vars)
-        except ForeignKeyViolationError:
-            # Insert the user if they do not exist
-            await db.execute("INSERT INTO discord_user (id, points, share_points) VALUES ($1, 0, 0);", self.user)
-            self.id = await db.fetchval(sql, *sql_vars)
+        self.id = await db.fetchval(CREATE_GOAL, self.user, self.text, self.reward, self.repeat.value)
 
         Goal._cache[self.id] = self
 
     async def edit(self, *, completed: bool = None, text: str = None, reward: int = None,
                    repeat: RepeatType = None) -> None:
         if completed is not None:
-            self.completed = completed
+            self.completed_at = datetime.now(UTC) if completed else None
+        elif not self.completed:
+            # A repeating goal that has reopened stays open whatever else changes
+            self.completed_at = None
         if text is not None:
             self.text = text
         if reward is not None:
             self.reward = reward
         if repeat is not None:
             self.repeat = repeat
+        self.bump_version()
+        if completed is not None or repeat is not None:
+            # The goal reopens at the owner's next reset time in their timezone
+            if self.completed_at is not None and self.repeat != RepeatType.NEVER:
+                u = await User.fetch(self.user)
+                self.reset_at = self.repeat.next_reset(self.completed_at, u.zone, u.reset_minute)
+            else:
+                self.reset_at = None
 
-        sql = "UPDATE goal SET completed=$2, text=$3, reward=$4, repeat=$5 WHERE id=$1;"
         await db.execute(
-            sql,
+            UPDATE_GOAL,
             self.id,
-            self.completed,
+            self.completed_at,
             self.text,
             self.reward,
             self.repeat.value,
+            self.reset_at,
         )
+        invalidation.publish("goal", self.id)
 
-    async def complete(self) -> None:
-        await self.edit(completed=True)
+    async def complete(self) -> bool:
+        """
+        Completes the goal, records the completion, updates its own and its owner's stats and pays the reward
+        :returns False if the goal was already completed, by another click that got there first
+        """
         u = await User.fetch(self.user)
-        await u.add_points(self.reward + self.reward * 0.1 * len(self.incentives), 1)
+        now = datetime.now(UTC)
+        crumbs = self.reward + self.reward * 0.1 * self.incentive_count
+        reset_at = self.repeat.next_reset(now, u.zone, u.reset_minute)
+        streak = self._current_streak + 1 if self.current_streak else 1
+        # Only repeating goals have periods to keep a streak across
+        streak_until = None if reset_at is None else self.repeat.next_reset(reset_at, u.zone, u.reset_minute)
+        today = now.astimezone(u.zone).date()
+        row = await db.fetch_one(COMPLETE_GOAL, self.id, now, reset_at, crumbs, streak, today, list(PERIODS),
+                                 period_starts(today), streak_until)
+        if row is None:
+            return False
+
+        self.completed_at = now
+        self.reset_at = reset_at
+        self.completions = row["completions"]
+        self.crumbs_earned = row["crumbs_earned"]
+        self.best_streak = row["best_streak"]
+        self._current_streak = streak
+        self.streak_until = streak_until
+        self.bump_version()
+        invalidation.publish("goal", self.id)
+
+        u.points = row["points"]
+        u.share_points = row["share_points"]
+        invalidation.publish("user", u.user_id)
+        return True
+
+    @staticmethod
+    async def create_many(user_id: int, goals: list[Self]) -> None:
+        """
+        Insert a user's goals with one COPY in one transaction, so either all of them are created or none are
+        They are not cached, COPY does not return their ids
+        """
+        async with db.transaction() as conn:
+            await conn.execute(str(CREATE_USER), user_id)
+            await conn.copy_records_to_table("goal", columns=COPY_COLUMNS,
+                                             records=[(user_id, g.text, g.reward, g.repeat.value) for g in goals])
 
     @staticmethod
     async def fetch(id: int) -> Self:
         r = Goal._cache.get(id)
         if r is None:
-            sql = "SELECT id, discord_user, text, reward, completed, repeat, reset_at, created FROM goal WHERE id=$1"
-            r = await Goal.from_db(await db.fetch_one(sql, id))
-            r.incentives = await Incentive.fetch_all_goal(id)
+            r = await Goal.from_db(await db.fetch_one(FETCH_GOAL, id))
+            Goal._cache[id] = r
 
         return r
 
     @staticmethod
-    async def fetch_user_goals(user_id: int, completed: bool) -> list[Self]:
-        if completed:
-            sql = "SELECT id, discord_user, text, reward, completed, repeat, reset_at, created FROM goal WHERE discord_user=$1 ORDER BY created;"
+    async def fetch_user_goals_page(user_id: int, completed: bool, after: tuple[datetime, int] | None = None,
+                                    limit: int = 5, before: tuple[datetime, int] | None = None) -> list[Self]:
+        """
+        Loads one page of goals with their incentives and caches them so viewing one does not need another query
+        :param completed: If completed goals should be included
+        :param after: The (created, id) key of the last goal on the previous page, None for the first page
+        :param before: The (created, id) key of the first goal on the next page, to go back a page instead
+        """
+        if before is not None:
+            sql = FETCH_USER_GOALS_PAGE_BEFORE if completed else FETCH_USER_OPEN_GOALS_PAGE_BEFORE
+            rows = list(reversed(await db.fetch(sql, user_id, limit, *before)))
+        elif after is None:
+            sql = FETCH_USER_GOALS_PAGE if completed else FETCH_USER_OPEN_GOALS_PAGE
+            rows = await db.fetch(sql, user_id, limit)
         else:
-            sql = "SELECT id, discord_user, text, reward, completed, repeat, reset_at, created FROM goal WHERE discord_user=$1 AND completed=false ORDER BY created;"
-        rows = await db.fetch(sql, user_id)
-        return [await Goal.from_db(r) for r in rows]
+            sql = FETCH_USER_GOALS_PAGE_AFTER if completed else FETCH_USER_OPEN_GOALS_PAGE_AFTER
+            rows = await db.fetch(sql, user_id, limit, *after)
+        goals = [await Goal.from_db(r) for r in rows]
+        for g in goals:
+            Goal._cache[g.id] = g
+        return goals
+
+    @staticmethod
+    async def preload_user_goals(user_ids: list[int], limit: int) -> int:
+        """Load and cache up to `limit` of the newest open goals of the users, :returns the number of goals loaded"""
+        rows = await db.fetch(PRELOAD_USERS_OPEN_GOALS, user_ids, limit)
+        for row in rows:
+            g = await Goal.from_db(row)
+            Goal._cache[g.id] = g
+        return len(rows)
+
+    @staticmethod
+    async def count_user_goals(user_id: int, completed: bool) -> int:
+        return await db.fetchval(COUNT_USER_GOALS if completed else COUNT_USER_OPEN_GOALS, user_id)
 
     @classmethod
     async def from_db(cls, row: Record) -> Self:
         g = cls(row["discord_user"], row["text"], RepeatType(row["repeat"]), row["reward"])
-        g.completed = row["completed"]
+        g.completed_at = row["completed_at"]
         g.reset_at = row["reset_at"]
         g.id = row["id"]
         g.created = row["created"]
+        g.incentive_count = row["incentive_count"]
+        g.senders = list(row["senders"])
+        g.completions = row["completions"]
+        g.crumbs_earned = row["crumbs_earned"]
+        g._current_streak = row["current_streak"]
+        g.best_streak = row["best_streak"]
+        g.streak_until = row["streak_until"]
 
         return g
 
@@ -2,38 +2,64 @@ from typing import Self
 
 from asyncpg import Record
 
+from utils.cache import ModelCache
 from utils.database import database as db
+from utils.invalidation import invalidation
+
+
+# The most senders a goal keeps in its summary, the rest are only counted. Matches the backfill in migration 0003.
+MAX_SENDERS = 10
+
+# The goal row is locked by the update, so concurrent incentives on one goal are counted one after another
+CREATE_INCENTIVE = db.statement("incentive_create", f"""
+    WITH added AS (INSERT INTO incentive (sender, goal) VALUES ($1, $2) RETURNING sender, goal)
+    UPDATE goal SET incentive_count = incentive_count + 1,
+                    senders = CASE WHEN added.sender = ANY(senders) OR cardinality(senders) >= {MAX_SENDERS}
+                                   THEN senders ELSE array_append(senders, added.sender) END
+    FROM added WHERE goal.id = added.goal
+    RETURNING incentive_count, senders;
+""")
+FETCH_INCENTIVE = db.statement("incentive_fetch", "SELECT goal, sender FROM incentive WHERE goal=$1 AND sender=$2;")
+FETCH_GOAL_INCENTIVES = db.statement("incentive_fetch_goal", "SELECT goal, sender FROM incentive WHERE goal=$1;")
 
 
 class Incentive:
     # Key: (Goal ID, Sender ID)
-    _cache: dict[tuple[int, int], Self] = {}
+    _cache: ModelCache = ModelCache("incentive")
 
     def __init__(self, sender: int, goal: int):
         self.sender: int = sender
         self.goal: int = goal
 
-    async def create(self):
-        sql = "INSERT INTO incentive (sender, goal) VALUES ($1, $2)"
-        await db.execute(sql, self.sender, self.goal)
+    async def create(self) -> tuple[int, list[int]]:
+        """:returns The goal's incentive count and sender summary including this incentive"""
+        row = await db.fetch_one(CREATE_INCENTIVE, self.sender, self.goal)
+        Incentive._cache[(self.goal, self.sender)] = self
+        # Goals are cached with their incentive count and senders
+        invalidation.publish("goal", self.goal)
+        return row["incentive_count"], list(row["senders"])
 
     @staticmethod
-    async def fetch(sender: int, goal: int) -> Self:
+    async def fetch(sender: int, goal: int) -> Self | None:
+        """:returns The incentive, or None if the sender has not added one to the goal"""
         r = Incentive._cache.get((goal, sender))
         if r is None:
-            sql = "SELECT goal, sender FROM incentive WHERE goal=$1 AND sender=$2;"
-            r = await Incentive.from_db(await db.fetch_one(sql, goal, sender))
+            r = await Incentive.from_db(await db.fetch_one(FETCH_INCENTIVE, goal, sender))
+            # Misses are not cached, the incentive could be added right after
+            if r is not None:
+                Incentive._cache[(goal, sender)] = r
 
         return r
 
     @staticmethod
     async def fetch_all_goal(goal: int) -> list[Self]:
-        sql = "SELECT goal, sender FROM incentive WHERE goal=$1;"
-        rows = await db.fetch(sql, goal)
+        rows = await db.fetch(FETCH_GOAL_INCENTIVES, goal)
         return [await Incentive.from_db(r) for r in rows]
 
     @classmethod
-    async def from_db(cls, row: Record) -> Self:
+    async def from_db(cls, row: Record | None) -> Self | None:
+        if row is None:
+            return None
         g = cls(row["sender"], row["goal"])
 
         return g
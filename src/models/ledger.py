@@ -0,0 +1,67 @@
+from asyncpg import Record
+
+from utils.database import database as db
+from utils.invalidation import invalidation
+
+
+# Every balance change is a single statement that updates the balance relative to its current value and appends a
+# record to point_transaction, so overlapping interactions for the same user can not lose each other's changes.
+CREDIT = db.statement("ledger_credit", """
+    WITH u AS (
+        UPDATE discord_user SET points=points + $2, share_points=share_points + $3 WHERE id=$1
+        RETURNING id, points, share_points
+    ), t AS (
+        INSERT INTO point_transaction (discord_user, points, share_points, reason) SELECT id, $2, $3, $4 FROM u
+    )
+    SELECT points, share_points FROM u;
+""")
+# Only deducts if the balance covers it. The current balance is returned either way so the caller can refresh
+DEBIT_POINTS = db.statement("ledger_debit_points", """
+    WITH u AS (
+        UPDATE discord_user SET points=points - $2 WHERE id=$1 AND points >= $2 RETURNING id, points
+    ), t AS (
+        INSERT INTO point_transaction (discord_user, points, share_points, reason) SELECT id, -$2, 0, $3 FROM u
+    )
+    SELECT EXISTS(SELECT 1 FROM u) AS ok,
+           COALESCE((SELECT points FROM u), (SELECT points FROM discord_user WHERE id=$1)) AS balance;
+""")
+DEBIT_SHARE_POINTS = db.statement("ledger_debit_share_points", """
+    WITH u AS (
+        UPDATE discord_user SET share_points=share_points - $2 WHERE id=$1 AND share_points >= $2
+        RETURNING id, share_points
+    ), t AS (
+        INSERT INTO point_transaction (discord_user, points, share_points, reason) SELECT id, 0, -$2, $3 FROM u
+    )
+    SELECT EXISTS(SELECT 1 FROM u) AS ok,
+           COALESCE((SELECT share_points FROM u), (SELECT share_points FROM discord_user WHERE id=$1)) AS balance;
+""")
+# Users whose balance changed most recently, used to decide which users to load before the bot is ready
+RECENT_USERS = db.statement("ledger_recent_users", """
+    SELECT discord_user FROM point_transaction WHERE created > now() - make_interval(hours => $2)
+    GROUP BY discord_user ORDER BY max(created) DESC LIMIT $1;
+""")
+
+
+async def credit(user_id: int, points: float, share_points: int, reason: str | None) -> Record | None:
+    """:returns The new balance, or None if the user does not exist"""
+    row = await db.fetch_one(CREDIT, user_id, points, share_points, reason)
+    invalidation.publish("user", user_id)
+    return row
+
+
+async def recent_users(limit: int, hours: int) -> list[int]:
+    return [r["discord_user"] for r in await db.fetch(RECENT_USERS, limit, hours)]
+
+
+async def debit_points(user_id: int, num: float, reason: str | None) -> Record:
+    row = await db.fetch_one(DEBIT_POINTS, user_id, num, reason)
+    if row["ok"]:
+        invalidation.publish("user", user_id)
+    return row
+
+
+async def debit_share_points(user_id: int, num: int, reason: str | None) -> Record:
+    row = await db.fetch_one(DEBIT_SHARE_POINTS, user_id, num, reason)
+    if row["ok"]:
+        invalidation.publish("user", user_id)
+    return row
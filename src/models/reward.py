@@ -1,14 +1,60 @@
+from datetime import datetime
 from textwrap import dedent
 from typing import Self
 
-from asyncpg import ForeignKeyViolationError, Record
+from asyncpg import Record
 from discord import ui, ButtonStyle
 
+from utils.cache import ModelCache, next_version, renders
 from utils.database import database as db
+from utils.invalidation import invalidation
+from models.user import ENSURE_USER, CREATE_USER, User
+
+
+CREATE_REWARD = db.statement("reward_create", ENSURE_USER +
+                             "INSERT INTO reward (discord_user, text, cost, renewable) "
+                             "VALUES ($1, $2, $3, $4) RETURNING id;")
+DELETE_REWARD = db.statement("reward_delete", "DELETE FROM reward WHERE id=$1;")
+REWARD_COLUMNS = "id, discord_user, text, cost, renewable, created"
+
+FETCH_REWARD = db.statement("reward_fetch", f"SELECT {REWARD_COLUMNS} FROM reward WHERE id=$1;")
+# Pages are keyset paginated on (created, id) the same way as goals
+FETCH_USER_REWARDS_PAGE = db.statement("reward_fetch_user_page", f"SELECT {REWARD_COLUMNS} FROM reward "
+                                                                 "WHERE discord_user=$1 ORDER BY created, id LIMIT $2;")
+FETCH_USER_REWARDS_PAGE_AFTER = db.statement("reward_fetch_user_page_after",
+                                             f"SELECT {REWARD_COLUMNS} FROM reward "
+                                             "WHERE discord_user=$1 AND (created, id) > ($3, $4) "
+                                             "ORDER BY created, id LIMIT $2;")
+FETCH_USER_REWARDS_PAGE_BEFORE = db.statement("reward_fetch_user_page_before",
+                                              f"SELECT {REWARD_COLUMNS} FROM reward "
+                                              "WHERE discord_user=$1 AND (created, id) < ($3, $4) "
+                                              "ORDER BY created DESC, id DESC LIMIT $2;")
+# Locking the reward serialises redeems of it, so a one time reward that is deleted by a concurrent redeem is not found.
+# The balance check is part of the UPDATE so two redeems can not overdraw, and the one time reward is only deleted if
+# the crumbs were taken.
+REDEEM_REWARD = db.statement("reward_redeem", """
+    WITH r AS (
+        SELECT id, text, cost, renewable FROM reward WHERE id=$2 FOR UPDATE
+    ), u AS (
+        UPDATE discord_user SET points=points - r.cost FROM r WHERE discord_user.id=$1 AND points >= r.cost
+        RETURNING discord_user.id, discord_user.points, r.cost
+    ), d AS (
+        DELETE FROM reward USING u WHERE reward.id=$2 AND NOT reward.renewable
+    ), t AS (
+        INSERT INTO point_transaction (discord_user, points, share_points, reason)
+        SELECT id, -cost, 0, 'reward_redeem' FROM u
+    )
+    SELECT r.text, r.cost, r.renewable, EXISTS(SELECT 1 FROM u) AS ok,
+           COALESCE((SELECT points FROM u), (SELECT points FROM discord_user WHERE id=$1)) AS balance
+    FROM r;
+""")
+# Imports are copied in, created keeps its default
+COPY_COLUMNS = ("discord_user", "text", "cost", "renewable")
+COUNT_USER_REWARDS = db.statement("reward_count_user", "SELECT count(*) FROM reward WHERE discord_user=$1;")
 
 
 class Reward:
-    _cache: dict[int, Self] = {}
+    _cache: ModelCache = ModelCache("reward", max_size=2048)
 
     def __init__(self, user: int, text: str, cost: int, renewable: bool):
         self.user = user
@@ -17,17 +63,24 @@ class Reward:
         self.renewable = renewable
 
         self.id = None
+        self.created = None
         self.deleted = False
 
+        # Changes whenever something shown by short_display changes
+        self.version = next_version()
+
     def display(self) -> ui.DesignerView:
         assert NotImplementedError()
 
-    def short_display(self) -> ui.Section:
-        output = dedent(f"""\
+    def _render_short_display(self) -> str:
+        return dedent(f"""\
             ### {self.text}
             {"Redeemable Once" if not self.renewable else ""}
         """)
 
+    def short_display(self) -> ui.Section:
+        output = renders.render(("reward_short", self.id), self.version, self._render_short_display)
+
         s = ui.Section(
             ui.TextDisplay(output),
             accessory=ui.Button(
@@ -41,15 +94,7 @@ class Reward:
         return s
 
     async def create(self) -> None:
-        sql = ("INSERT INTO reward (discord_user, text, cost, renewable) "
-               "VALUES ($1, $2, $3, $4) RETURNING id;")
-        sql_vars = (self.user, self.text, self.cost, self.renewable)
-        try:
-            self.id = await db.fetchval(sql, *sql_vars)
-        except ForeignKeyViolationError:
-            # Insert the user if they do not exist
-            await db.execute("INSERT INTO discord_user (id, points, share_points) VALUES ($1, 0, 0);", self.user)
-            self.id = await db.fetchval(sql, *sql_vars)
+        self.id = await db.fetchval(CREATE_REWARD, self.user, self.text, self.cost, self.renewable)
 
         Reward._cache[self.id] = self
 
@@ -57,32 +102,80 @@ class Reward:
         assert NotImplementedError()
 
     async def delete(self) -> None:
-        try:
-            Reward._cache.pop(self.id)
-        except KeyError:
-            pass
-        await db.execute("DELETE FROM reward WHERE id=$1;", self.id)
+        Reward._cache.pop(self.id)
+        await db.execute(DELETE_REWARD, self.id)
+        invalidation.publish("reward", self.id)
         self.deleted = True
+        self.version = next_version()
+
+    @staticmethod
+    async def create_many(user_id: int, rewards: list[Self]) -> None:
+        """
+        Insert a user's rewards with one COPY in one transaction, so either all of them are created or none are
+        They are not cached, COPY does not return their ids
+        """
+        async with db.transaction() as conn:
+            await conn.execute(str(CREATE_USER), user_id)
+            await conn.copy_records_to_table("reward", columns=COPY_COLUMNS,
+                                             records=[(user_id, r.text, r.cost, r.renewable) for r in rewards])
 
     @staticmethod
     async def fetch(id: int) -> Self:
         r = Reward._cache.get(id)
         if r is None:
-            sql = "SELECT id, discord_user, text, cost, renewable FROM reward WHERE id=$1;"
-            r = await Reward.from_db(await db.fetch_one(sql, id))
+            r = await Reward.from_db(await db.fetch_one(FETCH_REWARD, id))
 
         return r
 
     @staticmethod
-    async def fetch_user_rewards(user_id: int) -> list[Self]:
-        sql = "SELECT id, discord_user, text, cost, renewable FROM reward WHERE discord_user=$1 ORDER BY created;"
-        rows = await db.fetch(sql, user_id)
+    async def redeem(reward_id: int, user_id: int) -> Record | None:
+        """
+        Take the reward's cost from the user and remove it if it is not renewable, in one statement
+        :returns None if the reward does not exist, otherwise a record with the reward's `text`, `cost` and
+                 `renewable`, `ok` if it was redeemed and the user's `balance` afterwards
+        """
+        row = await db.fetch_one(REDEEM_REWARD, user_id, reward_id)
+        if row is None:
+            return None
+
+        u: User | None = User._cache.peek(user_id)
+        if u is not None and row["balance"] is not None:
+            u.points = row["balance"]
+        if row["ok"]:
+            invalidation.publish("user", user_id)
+        if row["ok"] and not row["renewable"]:
+            invalidation.publish("reward", reward_id)
+            r: Reward | None = Reward._cache.pop(reward_id)
+            if r is not None:
+                r.deleted = True
+                r.version = next_version()
+        return row
+
+    @staticmethod
+    async def fetch_user_rewards_page(user_id: int, after: tuple[datetime, int] | None = None,
+                                      limit: int = 5, before: tuple[datetime, int] | None = None) -> list[Self]:
+        """
+        Loads one page of a user's rewards
+        :param after: The (created, id) key of the last reward on the previous page, None for the first page
+        :param before: The (created, id) key of the first reward on the next page, to go back a page instead
+        """
+        if before is not None:
+            rows = list(reversed(await db.fetch(FETCH_USER_REWARDS_PAGE_BEFORE, user_id, limit, *before)))
+        elif after is None:
+            rows = await db.fetch(FETCH_USER_REWARDS_PAGE, user_id, limit)
+        else:
+            rows = await db.fetch(FETCH_USER_REWARDS_PAGE_AFTER, user_id, limit, *after)
         return [await Reward.from_db(r) for r in rows]
 
+    @staticmethod
+    async def count_user_rewards(user_id: int) -> int:
+        return await db.fetchval(COUNT_USER_REWARDS, user_id)
+
     @classmethod
     async def from_db(cls, row: Record) -> Self:
         g = cls(row["discord_user"], row["text"], row["cost"], row["renewable"])
         g.id = row["id"]
+        g.created = row["created"]
 
         Reward._cache[g.id] = g
 
@@ -0,0 +1,152 @@
+"""
+Completion Stats
+
+`Goal.complete` records every completion in `goal_completion` and updates the goal's, the user's and the user's day,
+week and month stats in the same statement, so reading them is a few primary key lookups however long the history is.
+Rebuild the stats from the history, after loading completions from the ledger from before it was recorded, with:
+    python -m models.stats --backfill
+"""
+import argparse
+import asyncio
+from datetime import date, datetime, timedelta, tzinfo
+from typing import Self
+
+from asyncpg import Record
+from dotenv import load_dotenv
+
+from utils.database import database as db
+
+
+PERIODS = ("day", "week", "month")
+
+FETCH_USER_STATS = db.statement("user_stats_fetch", "SELECT completions, crumbs_earned, current_streak, best_streak, "
+                                                    "last_day FROM user_stats WHERE discord_user=$1;")
+FETCH_USER_PERIOD_STATS = db.statement("user_period_stats_fetch",
+                                       "SELECT period, completions, crumbs FROM user_period_stats "
+                                       "WHERE discord_user=$1 AND (period, start) IN "
+                                       "(SELECT * FROM unnest($2::text[], $3::date[]));")
+
+# Ledger records of completions from before they were recorded, which have no goal. Later ones are already recorded.
+# Loaded once, the rows are marked backfilled so a second run finds them.
+BACKFILL_COMPLETIONS = """
+    INSERT INTO goal_completion (goal, discord_user, crumbs, completed, backfilled)
+    SELECT NULL, discord_user, points, created, true FROM point_transaction
+    WHERE reason = 'goal_complete'
+      AND created < coalesce((SELECT min(completed) FROM goal_completion WHERE NOT backfilled), 'infinity')
+      AND NOT EXISTS (SELECT 1 FROM goal_completion WHERE backfilled);
+"""
+# Streaks are the islands of consecutive local days, a day minus its rank is the same for every day of an island
+REBUILD_USER_STATS = """
+    WITH days AS (
+        SELECT DISTINCT c.discord_user, (c.completed AT TIME ZONE u.timezone)::date AS day
+        FROM goal_completion c JOIN discord_user u ON u.id = c.discord_user
+    ), islands AS (
+        SELECT discord_user, day, day - (row_number() OVER (PARTITION BY discord_user ORDER BY day))::int AS island
+        FROM days
+    ), runs AS (
+        SELECT discord_user, count(*) AS length, max(day) AS last_day FROM islands GROUP BY discord_user, island
+    ), streaks AS (
+        SELECT discord_user, max(length) AS best, (array_agg(length ORDER BY last_day DESC))[1] AS current,
+               max(last_day) AS last_day
+        FROM runs GROUP BY discord_user
+    ), totals AS (
+        SELECT discord_user, count(*) AS completions, sum(crumbs) AS crumbs FROM goal_completion GROUP BY discord_user
+    )
+    INSERT INTO user_stats (discord_user, completions, crumbs_earned, current_streak, best_streak, last_day)
+    SELECT discord_user, t.completions, t.crumbs, s.current, s.best, s.last_day FROM totals t JOIN streaks s USING (discord_user)
+    ON CONFLICT (discord_user) DO UPDATE SET completions = EXCLUDED.completions, crumbs_earned = EXCLUDED.crumbs_earned,
+        current_streak = EXCLUDED.current_streak, best_streak = EXCLUDED.best_streak, last_day = EXCLUDED.last_day;
+"""
+REBUILD_USER_PERIOD_STATS = """
+    DELETE FROM user_period_stats;
+    INSERT INTO user_period_stats (discord_user, period, start, completions, crumbs)
+    SELECT c.discord_user, p.period, date_trunc(p.period, c.completed AT TIME ZONE u.timezone)::date, count(*), sum(c.crumbs)
+    FROM goal_completion c JOIN discord_user u ON u.id = c.discord_user
+    CROSS JOIN unnest(ARRAY['day', 'week', 'month']) AS p(period)
+    GROUP BY 1, 2, 3;
+"""
+# The periods of a goal's streak depend on its repeat when each completion happened, which is not recorded, so only its
+# totals are rebuilt and its streak is left as it was kept
+REBUILD_GOAL_STATS = """
+    UPDATE goal SET completions = t.completions, crumbs_earned = t.crumbs
+    FROM (SELECT goal, count(*) AS completions, sum(crumbs) AS crumbs FROM goal_completion
+          WHERE goal IS NOT NULL GROUP BY goal) t
+    WHERE goal.id = t.goal AND (goal.completions, goal.crumbs_earned) IS DISTINCT FROM (t.completions, t.crumbs);
+"""
+
+
+def period_starts(day: date) -> list[date]:
+    """:returns The first day of the day, week and month `day` is in, in the order of PERIODS"""
+    return [day, day - timedelta(days=day.weekday()), day.replace(day=1)]
+
+
+class UserStats:
+    def __init__(self, user_id: int):
+        self.user_id = user_id
+        self.completions = 0
+        self.crumbs_earned = 0.0
+        self.best_streak = 0
+        self.today: date | None = None
+        self.last_day: date | None = None
+        self._current_streak = 0
+        # Key: Period, Value: (Completions, Crumbs)
+        self.periods: dict[str, tuple[int, float]] = {p: (0, 0.0) for p in PERIODS}
+
+    @property
+    def current_streak(self) -> int:
+        """The kept streak ended if the user has not completed a goal today or yesterday"""
+        if self.last_day is None or self.last_day < self.today - timedelta(days=1):
+            return 0
+        return self._current_streak
+
+    @classmethod
+    async def fetch(cls, user_id: int, zone: tzinfo) -> Self:
+        """Loads a user's totals and their current day, week and month, :param zone: The user's timezone"""
+        s = cls(user_id)
+        s.today = datetime.now(zone).date()
+        row, periods = await asyncio.gather(
+            db.fetch_one(FETCH_USER_STATS, user_id),
+            db.fetch(FETCH_USER_PERIOD_STATS, user_id, list(PERIODS), period_starts(s.today)),
+        )
+        s._load(row, periods)
+        return s
+
+    def _load(self, row: Record | None, periods: list[Record]) -> None:
+        if row is not None:
+            self.completions = row["completions"]
+            self.crumbs_earned = row["crumbs_earned"]
+            self._current_streak = row["current_streak"]
+            self.best_streak = row["best_streak"]
+            self.last_day = row["last_day"]
+        for p in periods:
+            self.periods[p["period"]] = (p["completions"], p["crumbs"])
+
+
+async def backfill() -> dict[str, str]:
+    """
+    Loads completions from the ledger and rebuilds every user's stats and every goal's totals from the history
+    Completing a goal waits until it finishes, so no completion is counted twice or missed.
+    :returns The status of each step
+    """
+    async with db.transaction() as conn:
+        await conn.execute("LOCK TABLE goal_completion IN SHARE MODE;")
+        return {
+            "completions": await conn.execute(BACKFILL_COMPLETIONS),
+            "user_stats": await conn.execute(REBUILD_USER_STATS),
+            "user_period_stats": await conn.execute(REBUILD_USER_PERIOD_STATS),
+            "goal_stats": await conn.execute(REBUILD_GOAL_STATS),
+        }
+
+
+async def main() -> dict[str, str]:
+    await db.connect()
+    return await backfill()
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backfill", action="store_true", required=True)
+    parser.parse_args()
+    for step, status in asyncio.run(main()).items():
+        print(f"{step}: {status}")
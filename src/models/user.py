@@ -1,60 +1,94 @@
-import decimal
 from typing import Self
+from zoneinfo import ZoneInfo
 
 from asyncpg import Record
 
+from models import ledger
+from utils.cache import ModelCache
 from utils.database import database as db
+from utils.invalidation import invalidation
+
+
+# Creates the user with the id in $1 if they do not exist. Statements that insert a row owned by a user start with this
+# CTE so a user's first interaction is one round trip, the foreign key is checked at the end of the statement so it
+# sees the inserted user.
+USER_COLUMNS = "id, points, share_points, timezone, reset_minute"
+ENSURE_USER = "WITH ensure_user AS (INSERT INTO discord_user (id, points, share_points) VALUES ($1, 0, 0) " \
+              f"ON CONFLICT (id) DO NOTHING RETURNING {USER_COLUMNS}) "
+
+CREATE_USER = db.statement("user_create", "INSERT INTO discord_user (id, points, share_points) VALUES ($1, 0, 0) "
+                                          "ON CONFLICT (id) DO NOTHING;")
+FETCH_USER = db.statement("user_fetch", f"SELECT {USER_COLUMNS} FROM discord_user WHERE id=$1;")
+FETCH_OR_CREATE_USER = db.statement("user_fetch_or_create", ENSURE_USER + "SELECT * FROM ensure_user UNION ALL "
+                                    f"SELECT {USER_COLUMNS} FROM discord_user WHERE id=$1;")
+FETCH_USERS = db.statement("user_fetch_many",
+                           f"SELECT {USER_COLUMNS} FROM discord_user WHERE id = ANY($1::bigint[]);")
+SET_RESET_TIME = db.statement("user_set_reset_time", "UPDATE discord_user SET timezone=$2, reset_minute=$3 WHERE id=$1;")
 
 
 class User:
-    _cache: dict[int, Self] = {}
+    _cache: ModelCache = ModelCache("user", max_size=4096)
 
     def __init__(self, user_id: int):
         self.user_id = user_id
         self.points = 0
         self.share_points = 0
+        # Repeating goals reset reset_minute minutes after midnight in this IANA timezone
+        self.timezone = "UTC"
+        self.reset_minute = 0
 
-        User._cache[self.user_id] = self
+    @property
+    def zone(self) -> ZoneInfo:
+        return ZoneInfo(self.timezone)
 
     async def create(self) -> None:
-        await db.execute("INSERT INTO discord_user (id, points, share_points) VALUES ($1, 0, 0);", self.user_id)
+        await db.execute(CREATE_USER, self.user_id)
 
-    async def use_points(self, num: int) -> bool:
-        """:returns True if the user had enough points, otherwise False"""
-        if self.points < num:
-            return False
+    async def set_reset_time(self, timezone: str, minute: int) -> None:
+        """Change when the user's goals reset, goals that are already completed still reset when they were going to"""
+        await db.execute(SET_RESET_TIME, self.user_id, timezone, minute)
+        self.timezone = timezone
+        self.reset_minute = minute
+        invalidation.publish("user", self.user_id)
 
-        self.points -= num
-        await db.execute("UPDATE discord_user SET points=$1 WHERE id=$2;", self.points, self.user_id)
-        return True
+    async def use_points(self, num: int, reason: str = None) -> bool:
+        """:returns True if the user had enough points, otherwise False"""
+        row = await ledger.debit_points(self.user_id, num, reason)
+        self.points = row["balance"]
+        return row["ok"]
 
-    async def use_share_points(self, num: int) -> bool:
+    async def use_share_points(self, num: int, reason: str = None) -> bool:
         """:returns True if the user had enough share points, otherwise False"""
-        if self.share_points < num:
-            return False
-
-        self.share_points -= num
-        await db.execute("UPDATE discord_user SET share_points=$1 WHERE id=$2;", self.share_points, self.user_id)
-        return True
+        row = await ledger.debit_share_points(self.user_id, num, reason)
+        self.share_points = row["balance"]
+        return row["ok"]
 
-    async def add_points(self, points: float = 0, share_points: int = 0) -> None:
-        self.points += points
-        self.share_points += share_points
-        await db.execute("UPDATE discord_user SET points=$1, share_points=$2 WHERE id=$3;", self.points, self.share_points, self.user_id)
+    async def add_points(self, points: float = 0, share_points: int = 0, reason: str = None) -> None:
+        row = await ledger.credit(self.user_id, points, share_points, reason)
+        if row is not None:
+            self.points = row["points"]
+            self.share_points = row["share_points"]
 
     @classmethod
     async def fetch(cls, id: int) -> Self:
         r = cls._cache.get(id)
         if r is None:
-            sql = "SELECT id, points, share_points FROM discord_user WHERE id=$1;"
-            r = await cls.from_db(await db.fetch_one(sql, id))
+            r = await cls.from_db(await db.fetch_one(FETCH_OR_CREATE_USER, id))
             if r is None:
-                r = cls(id)
-                await r.create()
+                # Another interaction created the user after this statement's snapshot was taken
+                r = await cls.from_db(await db.fetch_one(FETCH_USER, id))
             cls._cache[id] = r
 
         return r
 
+    @classmethod
+    async def preload(cls, ids: list[int]) -> int:
+        """Load and cache many users in one query, :returns the number of users loaded"""
+        rows = await db.fetch(FETCH_USERS, ids)
+        for row in rows:
+            cls._cache[row["id"]] = await cls.from_db(row)
+        return len(rows)
+
     @classmethod
     async def from_db(cls, row: Record) -> Self | None:
         if row is None:
@@ -62,5 +96,7 @@ class User:
         u = cls(row["id"])
         u.points = row["points"]
         u.share_points = row["share_points"]
+        u.timezone = row["timezone"]
+        u.reset_minute = row["reset_minute"]
 
         return u
@@ -0,0 +1,126 @@
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from itertools import count
+from os import environ
+from time import monotonic
+from typing import Any
+
+
+_MISSING = object()
+_versions = count()
+
+
+def next_version() -> int:
+    """A process wide increasing number, so two model objects never share a version"""
+    return next(_versions)
+
+
+class ModelCache:
+    """
+    A Size And Age Bounded LRU Cache Shared By The Models
+
+    The capacity and TTL can be overridden per model with the `CACHE_<NAME>_SIZE` and `CACHE_<NAME>_TTL`
+    environment variables. A TTL of 0 disables age based eviction.
+    """
+
+    _registry: dict[str, "ModelCache"] = {}
+
+    def __init__(self, name: str, max_size: int = 1024, ttl: float = 900):
+        self.name = name
+        self.max_size = int(environ.get(f"CACHE_{name.upper()}_SIZE", max_size))
+        self.ttl = float(environ.get(f"CACHE_{name.upper()}_TTL", ttl))
+
+        # Key: Model Key, Value: (Expires At, Model)
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        ModelCache._registry[name] = self
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.get(key, _MISSING)
+        if entry is _MISSING:
+            self.misses += 1
+            return default
+
+        expires, value = entry
+        if self.ttl and expires < monotonic():
+            del self._data[key]
+            self.evictions += 1
+            self.misses += 1
+            return default
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def peek(self, key: Hashable, default: Any = None) -> Any:
+        """Get A Cached Model Without Touching Its Recency Or The Counters"""
+        entry = self._data.get(key, _MISSING)
+        if entry is _MISSING:
+            return default
+        return entry[1]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        self._data[key] = (monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.pop(key, _MISSING)
+        if entry is _MISSING:
+            return default
+        return entry[1]
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __setitem__(self, key: Hashable, value: Any) -> None:
+        self.set(key, value)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict[str, int | float]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class RenderCache(ModelCache):
+    """Caches The Text Rendered For A Model, An Entry Is Only Used While The Model's Version Is Unchanged"""
+
+    def __init__(self, name: str, max_size: int = 4096):
+        super().__init__(name, max_size, ttl=0)
+
+    def render(self, key: Hashable, version: Hashable, render: Callable[[], Any]) -> Any:
+        entry = self._data.get(key)
+        if entry is not None and entry[1][0] == version:
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1][1]
+
+        self.misses += 1
+        rendered = render()
+        self.set(key, (version, rendered))
+        return rendered
+
+
+renders = RenderCache("render")
+
+
+def cache_stats() -> dict[str, dict[str, int | float]]:
+    return {name: cache.stats() for name, cache in ModelCache._registry.items()}
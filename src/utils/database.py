@@ -1,79 +1,248 @@
+import asyncio
 import json
-from collections.abc import Callable
+import logging
+import sys
+import traceback
+from collections.abc import AsyncIterator, Callable
 from contextlib import asynccontextmanager
+from functools import wraps
 from os import environ
+from time import perf_counter
 import asyncpg
 
 from asyncpg.exceptions import InterfaceError
 from asyncpg.transaction import Transaction
 
+from utils.metrics import histogram
+from utils.profiler import QueryProfiler
+
+
+log = logging.getLogger(__name__)
+
+pool_wait = histogram("db_pool_wait_seconds", "Time spent waiting to acquire a pooled connection")
+pool_hold = histogram("db_pool_hold_seconds", "Time a pooled connection was held before being released")
+
+
+class Statement(str):
+    """
+    SQL Text Registered Under A Name, Which Queries Are Grouped By
+    asyncpg only accepts an exact str, so the query helpers pass str(statement) to it
+    """
+
+    def __new__(cls, name: str, sql: str):
+        s = super().__new__(cls, sql)
+        s.name = name
+        return s
+
+
+class HeldConnection:
+    __slots__ = ("acquired", "caller", "reported")
+
+    def __init__(self, acquired: float, caller: traceback.FrameSummary | None):
+        self.acquired = acquired
+        # Where the connection was borrowed, its source line is only read if it is reported
+        self.caller = caller
+        self.reported = False
+
+    def format_caller(self) -> str:
+        return "".join(traceback.StackSummary.from_list([self.caller]).format()) if self.caller else ""
+
 
 class Database:
     def __init__(self) -> None:
         self._connection_pool = None
+        self._statements: dict[str, Statement] = {}
+
+        # Seconds a connection can be held before it is reported as leaked, 0 disables the leak detector
+        self.leak_threshold = float(environ.get("DB_LEAK_THRESHOLD", 30))
+        # Key: id() Of The Acquired Connection
+        self._held: dict[int, HeldConnection] = {}
+        self._leak_watchdog: asyncio.Task | None = None
+        self.profiler: QueryProfiler | None = None
+
+    def statement(self, name: str, sql: str) -> Statement:
+        """
+        Register A Named Statement, asyncpg's statement cache prepares it once per pooled connection
+        :param name: A unique name for the statement
+        :param sql: The SQL text of the statement
+        :return: The statement, which can be passed anywhere SQL text is accepted
+        """
+        existing = self._statements.get(name)
+        if existing is not None and existing != sql:
+            raise ValueError(f"A Different Statement Is Already Registered As `{name}`")
+        stmt = Statement(name, sql)
+        self._statements[name] = stmt
+        return stmt
+
+    @staticmethod
+    def connection_args() -> dict[str, str]:
+        return {
+            "database": environ["DB_NAME"],
+            "host": environ["DB_HOST"],
+            "user": environ["DB_USER"],
+            "password": environ["DB_PASS"],
+        }
 
     async def connect(self):
         if not self._connection_pool:
             self._connection_pool = await asyncpg.create_pool(
-                database=environ["DB_NAME"],
-                host=environ["DB_HOST"],
-                user=environ["DB_USER"],
-                password=environ["DB_PASS"],
+                **self.connection_args(),
                 min_size=3,
                 max_size=15,
+                # Room for every registered statement, so they are parsed once per connection and never evicted
+                statement_cache_size=len(self._statements) + 100,
+                init=self._init_connection,
             )
+            if self.leak_threshold and self._leak_watchdog is None:
+                self._leak_watchdog = asyncio.create_task(self._watch_leaks())
+            # Opt in with DB_PROFILE, the plan of a query slower than DB_SLOW_QUERY_MS is captured at most once every
+            # DB_EXPLAIN_INTERVAL seconds for each statement
+            if environ.get("DB_PROFILE") and self.profiler is None:
+                self.profiler = QueryProfiler(self.explain,
+                                              float(environ.get("DB_SLOW_QUERY_MS", 100)) / 1000,
+                                              float(environ.get("DB_EXPLAIN_INTERVAL", 300)))
 
-    async def _acquire(self):
-        if not self._connection_pool:
-            await self.connect()
-        conn: asyncpg.Connection = await self._connection_pool.acquire()
+    async def _init_connection(self, conn: asyncpg.Connection) -> None:
+        """Runs Once When The Pool Opens A New Connection"""
         await conn.set_type_codec(
             "jsonb",
             encoder=json.dumps,
             decoder=json.loads,
             schema="pg_catalog",
         )
+
+    async def _acquire(self):
+        if not self._connection_pool:
+            await self.connect()
+        start = perf_counter()
+        conn: asyncpg.Connection = await self._connection_pool.acquire()
+        acquired = perf_counter()
+        pool_wait.observe(acquired - start)
+
+        caller = None
+        if self.leak_threshold:
+            # Skip this frame and the context manager frames. Formatting the whole stack on every acquire costs more
+            # than a query, so only the caller's position is kept.
+            frame = sys._getframe(3)
+            caller = traceback.FrameSummary(frame.f_code.co_filename, frame.f_lineno, frame.f_code.co_name,
+                                            lookup_line=False)
+        self._held[id(conn)] = HeldConnection(acquired, caller)
         return conn
 
     async def _recycle(self, conn):
+        held = self._held.pop(id(conn), None)
+        if held is not None:
+            pool_hold.observe(perf_counter() - held.acquired)
         try:
             await self._connection_pool.release(conn)
         except InterfaceError:
             pass
 
-    async def execute(self, sql: str, *args) -> None:
+    @asynccontextmanager
+    async def connection(self) -> AsyncIterator[asyncpg.Connection]:
+        """Borrow A Pooled Connection That Is Always Released, Even If The Body Raises"""
         conn = await self._acquire()
-        await conn.execute(sql, *args)
-        await self._recycle(conn)
+        try:
+            yield conn
+        finally:
+            await self._recycle(conn)
+
+    def leaked(self) -> list[tuple[float, str]]:
+        """:returns How long each connection held past the leak threshold has been held, with where it was borrowed"""
+        now = perf_counter()
+        return [(now - h.acquired, h.format_caller()) for h in self._held.values()
+                if now - h.acquired > self.leak_threshold]
+
+    async def _watch_leaks(self) -> None:
+        while True:
+            await asyncio.sleep(self.leak_threshold / 2)
+            now = perf_counter()
+            for held in list(self._held.values()):
+                if held.reported or now - held.acquired <= self.leak_threshold:
+                    continue
+                held.reported = True
+                log.warning("Connection held for %.1fs, acquired at:\n%s", now - held.acquired, held.format_caller())
+
+    def pool_stats(self) -> dict[str, int]:
+        if not self._connection_pool:
+            return {"size": 0, "idle": 0, "held": 0, "max_size": 0}
+        return {
+            "size": self._connection_pool.get_size(),
+            "idle": self._connection_pool.get_idle_size(),
+            "held": len(self._held),
+            "max_size": self._connection_pool.get_max_size(),
+        }
+
+    async def execute(self, sql: str, *args) -> None:
+        async with self.connection() as conn:
+            start = perf_counter()
+            await conn.execute(str(sql), *args)
+            elapsed = perf_counter() - start
+        if self.profiler:
+            self.profiler.record(sql, args, elapsed)
 
     async def fetchval(self, sql: str, *args, column=0, timeout=None):
-        conn = await self._acquire()
-        val = await conn.fetchval(sql, *args, column=column, timeout=timeout)
-        await self._recycle(conn)
-        return val
+        async with self.connection() as conn:
+            start = perf_counter()
+            value = await conn.fetchval(str(sql), *args, column=column, timeout=timeout)
+            elapsed = perf_counter() - start
+        if self.profiler:
+            self.profiler.record(sql, args, elapsed)
+        return value
 
     async def fetch(self, sql: str, *args) -> list[asyncpg.Record]:
-        conn = await self._acquire()
-        rows: list[asyncpg.Record] = await conn.fetch(sql, *args)
-        await self._recycle(conn)
+        async with self.connection() as conn:
+            start = perf_counter()
+            rows: list[asyncpg.Record] = await conn.fetch(str(sql), *args)
+            elapsed = perf_counter() - start
+        if self.profiler:
+            self.profiler.record(sql, args, elapsed)
         return rows or []
 
     async def fetch_one(self, sql: str, *args) -> asyncpg.Record | None:
-        conn = await self._acquire()
-        row: asyncpg.Record = await conn.fetchrow(sql, *args)
-        await self._recycle(conn)
+        async with self.connection() as conn:
+            start = perf_counter()
+            row = await conn.fetchrow(str(sql), *args)
+            elapsed = perf_counter() - start
+        if self.profiler:
+            self.profiler.record(sql, args, elapsed)
         return row
 
+    async def explain(self, sql: str, args: tuple) -> str:
+        """
+        Run `EXPLAIN (ANALYZE, BUFFERS)` for a query with its parameters
+        The query is run in a transaction that is rolled back, so statements that write leave nothing behind
+        :return: The text of the plan
+        """
+        async with self.connection() as conn:
+            tr = conn.transaction()
+            await tr.start()
+            try:
+                rows = await conn.fetch("EXPLAIN (ANALYZE, BUFFERS) " + sql, *args)
+            finally:
+                await tr.rollback()
+        return "\n".join(r[0] for r in rows)
+
+    @asynccontextmanager
+    async def snapshot(self) -> AsyncIterator[asyncpg.Connection]:
+        """Borrow A Connection In A Read Only Transaction, Every Query On It Sees The Database As Of The First One"""
+        async with self.connection() as conn:
+            async with conn.transaction(isolation="repeatable_read", readonly=True):
+                yield conn
+
+    async def stream(self, conn: asyncpg.Connection, sql: str, *args, prefetch: int = 500) -> AsyncIterator[asyncpg.Record]:
+        """
+        Yield the rows of a query from a server side cursor, holding at most `prefetch` of them at a time
+        :param conn: A connection in a transaction, like one from `snapshot`, a cursor only lasts as long as its transaction
+        """
+        async for row in conn.cursor(str(sql), *args, prefetch=prefetch):
+            yield row
+
     @asynccontextmanager
     async def transaction(self) -> tuple[asyncpg.Connection, Transaction]:
-        conn = None
-        try:
-            conn = await self._acquire()
+        async with self.connection() as conn:
             async with conn.transaction():
                 yield conn
-        finally:
-            if conn is not None:
-                await self._recycle(conn)
 
     def transactional(self, func: Callable):
         """
@@ -84,10 +253,12 @@ class Database:
         if func.__annotations__.get("conn") is None:
             raise ValueError("Transactional Functions Must Have A `conn` Keyword Argument")
 
+        @wraps(func)
         async def wrapper(*args, conn: asyncpg.Connection = None, **kwargs):
             if conn is not None:
                 return await func(*args, conn=conn, **kwargs)
-            return await func(*args, conn=await self._acquire(), **kwargs)
+            async with self.connection() as conn:
+                return await func(*args, conn=conn, **kwargs)
         return wrapper
 
 
@@ -0,0 +1,129 @@
+import asyncio
+import re
+from collections.abc import Awaitable, Callable, Hashable
+from time import monotonic
+from types import SimpleNamespace
+
+import aiohttp
+from discord import Bot, Interaction, ui
+
+from utils.metrics import counter
+
+# Interaction responses and edits are rate limited per interaction token
+_TOKEN_PATH = re.compile(r"/(?:webhooks|interactions)/\d+/([^/]+)/")
+
+Render = Callable[[], Awaitable[ui.View]]
+
+
+class RateLimits:
+    """Remembers The Rate Limit Headers Of Every Interaction Token So Edits Can Wait Instead Of Getting A 429"""
+
+    def __init__(self) -> None:
+        # Key: Interaction Token, Value: (Requests Remaining, monotonic() When The Bucket Resets)
+        self._buckets: dict[str, tuple[int, float]] = {}
+
+    def install(self, bot: Bot) -> None:
+        """Read the headers of every response on the bot's HTTP session, which interactions also use"""
+        trace = aiohttp.TraceConfig()
+        trace.on_request_end.append(self._on_request_end)
+        trace.freeze()
+
+        async def attach():
+            # pycord creates the session when it logs in and again if it was closed, interactions reach it the same way
+            session: aiohttp.ClientSession = bot.http._HTTPClient__session
+            if trace not in session.trace_configs:
+                session.trace_configs.append(trace)
+
+        bot.add_listener(attach, "on_connect")
+
+    async def _on_request_end(self, session: aiohttp.ClientSession, ctx: SimpleNamespace,
+                              params: aiohttp.TraceRequestEndParams) -> None:
+        match = _TOKEN_PATH.search(params.url.path)
+        remaining = params.response.headers.get("X-RateLimit-Remaining")
+        reset_after = params.response.headers.get("X-RateLimit-Reset-After")
+        if match is None or remaining is None or reset_after is None:
+            return
+        now = monotonic()
+        self._buckets[match[1]] = (int(remaining), now + float(reset_after))
+        # Tokens are only valid for 15 minutes, so expired buckets are dropped as they pile up
+        if len(self._buckets) > 1024:
+            self._buckets = {k: v for k, v in self._buckets.items() if v[1] > now}
+
+    async def wait(self, token: str) -> None:
+        """Wait until the token's bucket has a request left"""
+        remaining, resets_at = self._buckets.get(token, (1, 0))
+        delay = resets_at - monotonic()
+        if remaining == 0 and delay > 0:
+            await asyncio.sleep(delay)
+
+
+class _MessageEdits:
+    __slots__ = ("interaction", "render", "state", "dirty")
+
+    def __init__(self, interaction: Interaction, render: Render, state: Hashable | None):
+        self.interaction = interaction
+        self.render = render
+        self.state = state
+        self.dirty = True
+
+
+class EditScheduler:
+    """
+    Coalesces Rapid Edits Of One Message Into One Edit Of Its Latest State
+
+    The first interaction on a message renders and responds with the edit. Interactions on the same message that arrive
+    while that is running are acknowledged without an edit, then one more edit shows the state after the last of them.
+    Follow up edits wait for the interaction's rate limit bucket instead of running into a 429.
+    """
+
+    def __init__(self) -> None:
+        self.rate_limits = RateLimits()
+        # Key: Message ID
+        self._messages: dict[int, _MessageEdits] = {}
+
+        self.requested = counter("message_edit_requests_total", "Paginator edits requested by interactions")
+        self.sent = counter("message_edits_total", "Paginator edits sent to Discord")
+        self.saved = counter("message_edits_saved_total", "Paginator edits skipped because a later one replaced them")
+
+    async def edit(self, interaction: Interaction, render: Render, state: Hashable | None = None) -> None:
+        """
+        Edit the message the interaction's component is on with the view `render` returns
+        :param render: Builds the view from the current state, it is called once for each edit that is sent
+        :param state: Identifies what `render` shows, a click asking for the state already being sent adds no edit
+        """
+        self.requested.inc()
+        key = interaction.message.id
+        if key in self._messages:
+            # Acknowledged before it is handed over so the running edit never has to respond to it
+            await interaction.response.defer()
+            pending = self._messages.get(key)
+            if pending is not None and state is not None and state == pending.state:
+                self.saved.inc()
+                return
+            if pending is not None:
+                # The running edit sends the latest state once it is done, replacing any state still waiting for it
+                if pending.dirty:
+                    self.saved.inc()
+                pending.interaction = interaction
+                pending.render = render
+                pending.state = state
+                pending.dirty = True
+                return
+
+        pending = self._messages[key] = _MessageEdits(interaction, render, state)
+        try:
+            while pending.dirty:
+                pending.dirty = False
+                latest = pending.interaction
+                view = await pending.render()
+                if not latest.response.is_done():
+                    await latest.response.edit_message(view=view)
+                else:
+                    await self.rate_limits.wait(latest.token)
+                    await latest.edit_original_response(view=view)
+                self.sent.inc()
+        finally:
+            del self._messages[key]
+
+
+edits = EditScheduler()
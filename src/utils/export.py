@@ -0,0 +1,102 @@
+"""
+Personal Data Export
+
+Writes users' balances, goals, rewards, incentives, completions and point history as gzip compressed JSON Lines, one object per row
+with a `type` key. Rows are streamed from server side cursors in one read only snapshot and compressed as they
+arrive, so memory use does not grow with the size of the export. `/export` sends a user their own data. Export some
+or all users by hand with:
+    python -m utils.export <output.jsonl.gz> [--user ID ...]
+"""
+import argparse
+import asyncio
+import gzip
+import json
+from datetime import datetime
+from typing import BinaryIO
+
+from dotenv import load_dotenv
+
+from utils.database import database as db
+
+
+USER_COLUMNS = "SELECT id, points, share_points, timezone, reset_minute FROM discord_user"
+GOAL_COLUMNS = "SELECT id, discord_user, text, reward, completed_at, repeat, reset_at, created, incentive_count FROM goal"
+REWARD_COLUMNS = "SELECT id, discord_user, text, cost, renewable, created FROM reward"
+INCENTIVE_COLUMNS = "SELECT incentive.goal, incentive.sender FROM incentive"
+COMPLETION_COLUMNS = "SELECT id, goal, discord_user, crumbs, completed FROM goal_completion"
+TRANSACTION_COLUMNS = "SELECT id, discord_user, points, share_points, reason, created FROM point_transaction"
+
+# Key: Record Type, Value: (Statement For Some Users, Query For Every User)
+EXPORTS = {
+    "user": (
+        db.statement("export_users", USER_COLUMNS + " WHERE id = ANY($1::bigint[]) ORDER BY id;"),
+        USER_COLUMNS + " ORDER BY id;",
+    ),
+    "goal": (
+        db.statement("export_goals", GOAL_COLUMNS + " WHERE discord_user = ANY($1::bigint[]) "
+                                                    "ORDER BY discord_user, created, id;"),
+        GOAL_COLUMNS + " ORDER BY discord_user, created, id;",
+    ),
+    "reward": (
+        db.statement("export_rewards", REWARD_COLUMNS + " WHERE discord_user = ANY($1::bigint[]) "
+                                                        "ORDER BY discord_user, created, id;"),
+        REWARD_COLUMNS + " ORDER BY discord_user, created, id;",
+    ),
+    # Incentives on the users' goals and the ones they gave to other users' goals
+    "incentive": (
+        db.statement("export_incentives",
+                     INCENTIVE_COLUMNS + " JOIN goal ON goal.id=incentive.goal WHERE goal.discord_user = ANY($1::bigint[]) "
+                     "UNION " + INCENTIVE_COLUMNS + " WHERE incentive.sender = ANY($1::bigint[]);"),
+        INCENTIVE_COLUMNS + ";",
+    ),
+    "completion": (
+        db.statement("export_completions", COMPLETION_COLUMNS + " WHERE discord_user = ANY($1::bigint[]) "
+                                                                "ORDER BY discord_user, completed, id;"),
+        COMPLETION_COLUMNS + " ORDER BY discord_user, completed, id;",
+    ),
+    "transaction": (
+        db.statement("export_transactions", TRANSACTION_COLUMNS + " WHERE discord_user = ANY($1::bigint[]) "
+                                                                  "ORDER BY discord_user, created, id;"),
+        TRANSACTION_COLUMNS + " ORDER BY discord_user, created, id;",
+    ),
+}
+
+
+def _encode(value: object) -> str:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Can not export {type(value).__name__}")
+
+
+async def write_export(out: BinaryIO, user_ids: list[int] | None) -> int:
+    """
+    Write the export to a binary file
+    :param user_ids: The users to export, or None for every user
+    :returns The number of rows written
+    """
+    rows = 0
+    with gzip.GzipFile(fileobj=out, mode="wb") as gz:
+        async with db.snapshot() as conn:
+            for kind, (some, every) in EXPORTS.items():
+                cursor = db.stream(conn, every) if user_ids is None else db.stream(conn, some, user_ids)
+                async for row in cursor:
+                    gz.write(json.dumps({"type": kind} | dict(row), default=_encode, separators=(",", ":")).encode())
+                    gz.write(b"\n")
+                    rows += 1
+    return rows
+
+
+async def main(path: str, user_ids: list[int] | None) -> int:
+    await db.connect()
+    with open(path, "wb") as f:
+        return await write_export(f, user_ids)
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("output")
+    parser.add_argument("--user", type=int, action="append", help="A user to export, every user if left out")
+    args = parser.parse_args()
+    count = asyncio.run(main(args.output, args.user))
+    print(f"Exported {count} rows to {args.output}")
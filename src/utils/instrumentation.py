@@ -0,0 +1,121 @@
+import logging
+from collections.abc import Callable
+from functools import wraps
+from time import perf_counter
+
+from aiohttp import web
+from discord import ApplicationContext, Bot, DiscordException
+
+from utils.cache import cache_stats
+from utils.database import Database, Statement
+from utils.metrics import Counter, Histogram, counter, gauge, histogram, render_prometheus
+
+
+log = logging.getLogger(__name__)
+
+
+def _timer(name: str, description: str, labels: dict[str, str]) -> tuple[Histogram, Counter]:
+    return (histogram(f"{name}_seconds", description, labels=labels),
+            counter(f"{name}_errors_total", description + " that raised", labels=labels))
+
+
+def timed(name: str):
+    """Record the latency and errors of a modal callback, modal submissions do not go through the router"""
+    latency, errors = _timer("modal", "Modal submission latency", {"modal": name})
+
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            except Exception:
+                errors.inc()
+                raise
+            finally:
+                latency.observe(perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def instrument_bot(bot: Bot) -> None:
+    """Time every application command from when it is invoked until it completes or fails"""
+    # Key: Interaction ID
+    started: dict[int, float] = {}
+
+    def finish(ctx: ApplicationContext, failed: bool) -> None:
+        start = started.pop(ctx.interaction.id, None)
+        if start is None:
+            return
+        latency, errors = _timer("command", "Application command latency", {"command": ctx.command.qualified_name})
+        latency.observe(perf_counter() - start)
+        if failed:
+            errors.inc()
+
+    async def on_application_command(ctx: ApplicationContext):
+        started[ctx.interaction.id] = perf_counter()
+
+    async def on_application_command_completion(ctx: ApplicationContext):
+        finish(ctx, False)
+
+    async def on_application_command_error(ctx: ApplicationContext, error: DiscordException):
+        finish(ctx, True)
+        # Adding a listener for this event replaces the default handler that printed the traceback
+        log.error("Ignoring exception in command %s", ctx.command, exc_info=error)
+
+    bot.add_listener(on_application_command)
+    bot.add_listener(on_application_command_completion)
+    bot.add_listener(on_application_command_error)
+
+
+def instrument_database(database: Database) -> None:
+    """Time every query helper, labelled by the method and the registered statement name"""
+
+    def wrap(method_name: str, method: Callable):
+        timers: dict[str, tuple[Histogram, Counter]] = {}
+
+        @wraps(method)
+        async def timed_query(sql: str, *args, **kwargs):
+            name = sql.name if isinstance(sql, Statement) else "unregistered"
+            timer = timers.get(name)
+            if timer is None:
+                timer = timers[name] = _timer("db_query", "Database query latency",
+                                              {"method": method_name, "statement": name})
+            start = perf_counter()
+            try:
+                return await method(sql, *args, **kwargs)
+            except Exception:
+                timer[1].inc()
+                raise
+            finally:
+                timer[0].observe(perf_counter() - start)
+        return timed_query
+
+    for method_name in ("execute", "fetch", "fetch_one", "fetchval"):
+        setattr(database, method_name, wrap(method_name, getattr(database, method_name)))
+
+    gauge("db_pool_connections", "Connections in the pool by state",
+          lambda: [({"state": k}, v) for k, v in database.pool_stats().items()])
+
+
+def _cache_gauge(stat: str) -> Callable[[], list[tuple[dict[str, str], float]]]:
+    return lambda: [({"cache": name}, stats[stat]) for name, stats in cache_stats().items()]
+
+
+gauge("model_cache_hit_ratio", "Model cache hits over lookups", _cache_gauge("hit_ratio"))
+gauge("model_cache_size", "Objects held by each model cache", _cache_gauge("size"))
+gauge("model_cache_evictions", "Objects evicted from each model cache", _cache_gauge("evictions"))
+
+
+async def serve(port: int, host: str = "127.0.0.1") -> web.AppRunner:
+    """Serve the metrics in the Prometheus text format on http://host:port/metrics"""
+    async def metrics(request: web.Request) -> web.Response:
+        return web.Response(text=render_prometheus(), content_type="text/plain", charset="utf-8")
+
+    app = web.Application()
+    app.router.add_get("/metrics", metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    log.info("Serving metrics on http://%s:%d/metrics", host, port)
+    return runner
@@ -0,0 +1,116 @@
+import asyncio
+import json
+import logging
+from collections.abc import Hashable, Iterable
+from uuid import uuid4
+
+import asyncpg
+
+from utils.cache import ModelCache
+from utils.database import database as db
+from utils.metrics import counter
+
+
+log = logging.getLogger(__name__)
+
+CHANNEL = "meowtivation_cache"
+# Postgres rejects payloads of 8000 bytes or more, 100 of the largest keys, a pair of snowflakes, fit in about 4500
+KEYS_PER_PAYLOAD = 100
+
+NOTIFY = db.statement("cache_notify", "SELECT pg_notify($1, payload) FROM unnest($2::text[]) AS payload;")
+
+published = counter("cache_invalidations_published_total", "Cache keys this process told other processes to drop")
+received = counter("cache_invalidations_received_total", "Cache keys other processes told this process to drop")
+
+
+class Invalidator:
+    """
+    Keeps The Model Caches Of Several Processes Coherent Over Postgres LISTEN/NOTIFY
+
+    Models publish the key of every object they write. Keys published in the same event loop iteration are sent
+    together in one statement after the write, and every other process drops those keys from its caches so the next
+    fetch reads the database. A process that loses its listening connection clears its caches, because it may have
+    missed invalidations while it was disconnected.
+    """
+
+    def __init__(self) -> None:
+        self.origin = uuid4().hex
+        self.enabled = False
+        self._conn: asyncpg.Connection | None = None
+        # Key: Cache Name, Value: Keys To Publish
+        self._pending: dict[str, set[Hashable]] = {}
+        self._flush_task: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        """Start publishing and listening, only needed when more than one process shares the database"""
+        self.enabled = True
+        await self._listen()
+
+    async def _listen(self) -> None:
+        # LISTEN needs a connection of its own, a pooled connection would stop receiving when it is released
+        self._conn = await asyncpg.connect(**db.connection_args())
+        self._conn.add_termination_listener(self._on_lost)
+        await self._conn.add_listener(CHANNEL, self._on_notify)
+
+    def _on_lost(self, conn: asyncpg.Connection) -> None:
+        log.warning("Lost the cache invalidation connection, clearing the model caches and reconnecting")
+        asyncio.create_task(self._reconnect())
+
+    async def _reconnect(self) -> None:
+        delay = 1
+        while True:
+            try:
+                await self._listen()
+                break
+            except (OSError, asyncpg.PostgresError):
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 60)
+        # Cleared after listening again so nothing written in between is missed
+        for cache in ModelCache._registry.values():
+            cache.clear()
+
+    def _on_notify(self, conn: asyncpg.Connection, pid: int, channel: str, payload: str) -> None:
+        message = json.loads(payload)
+        if message["o"] == self.origin:
+            return
+        cache = ModelCache._registry.get(message["c"])
+        if cache is None:
+            return
+        for key in message["k"]:
+            # JSON has no tuples, composite keys arrive as lists
+            cache.pop(tuple(key) if isinstance(key, list) else key)
+        received.inc(len(message["k"]))
+
+    def publish(self, cache: str, key: Hashable) -> None:
+        self.publish_many(cache, (key,))
+
+    def publish_many(self, cache: str, keys: Iterable[Hashable]) -> None:
+        if self.enabled:
+            self._pending.setdefault(cache, set()).update(keys)
+            if self._flush_task is None:
+                self._flush_task = asyncio.create_task(self._flush_soon())
+
+    async def _flush_soon(self) -> None:
+        await asyncio.sleep(0)
+        self._flush_task = None
+        try:
+            await self.flush()
+        except Exception:
+            log.exception("Failed to publish cache invalidations, other processes may serve stale objects until "
+                          "their cache entries expire")
+
+    async def flush(self) -> None:
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        payloads = []
+        for cache, keys in pending.items():
+            keys = list(keys)
+            published.inc(len(keys))
+            for i in range(0, len(keys), KEYS_PER_PAYLOAD):
+                payloads.append(json.dumps({"o": self.origin, "c": cache, "k": keys[i:i + KEYS_PER_PAYLOAD]},
+                                           separators=(",", ":")))
+        await db.execute(NOTIFY, CHANNEL, payloads)
+
+
+invalidation = Invalidator()
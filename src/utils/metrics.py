@@ -0,0 +1,165 @@
+from bisect import bisect_left
+from collections.abc import Callable, Iterable
+
+
+# Seconds, From 1ms Up To 10s
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _key(name: str, labels: dict[str, str] | None) -> tuple[str, tuple[tuple[str, str], ...]]:
+    return name, tuple(sorted((labels or {}).items()))
+
+
+class Counter:
+    def __init__(self, name: str, description: str, labels: dict[str, str] | None = None):
+        self.name = name
+        self.description = description
+        self.labels = labels or {}
+        self.value = 0
+
+    def inc(self, amount: int = 1) -> None:
+        self.value += amount
+
+
+class Histogram:
+    """A Fixed Bucket Histogram, Cumulative In The Same Way As Prometheus Histograms"""
+
+    def __init__(self, name: str, description: str, buckets: Iterable[float] = DEFAULT_BUCKETS,
+                 labels: dict[str, str] | None = None):
+        self.name = name
+        self.description = description
+        self.labels = labels or {}
+        self.buckets = tuple(sorted(buckets))
+        # The last slot counts observations above the largest bucket
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> float:
+        """:returns The upper bound of the bucket the quantile falls in"""
+        if self.count == 0:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return self.max
+
+    def cumulative(self) -> list[tuple[float, int]]:
+        out = []
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            out.append((bound, seen))
+        out.append((float("inf"), self.count))
+        return out
+
+    def stats(self) -> dict[str, float]:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count else 0.0,
+            "p50": self.quantile(0.5),
+            "p99": self.quantile(0.99),
+            "max": self.max,
+        }
+
+
+class Gauge:
+    """A Value Read When The Metrics Are Collected, `read` Returns The Value For Each Set Of Labels"""
+
+    def __init__(self, name: str, description: str, read: Callable[[], list[tuple[dict[str, str], float]]]):
+        self.name = name
+        self.description = description
+        self.read = read
+
+
+_counters: dict[tuple, Counter] = {}
+_histograms: dict[tuple, Histogram] = {}
+_gauges: dict[str, Gauge] = {}
+
+
+def counter(name: str, description: str, labels: dict[str, str] | None = None) -> Counter:
+    """Get The Counter Registered As `name` With `labels`, Creating It If It Does Not Exist"""
+    key = _key(name, labels)
+    c = _counters.get(key)
+    if c is None:
+        c = Counter(name, description, labels)
+        _counters[key] = c
+    return c
+
+
+def histogram(name: str, description: str, buckets: Iterable[float] = DEFAULT_BUCKETS,
+              labels: dict[str, str] | None = None) -> Histogram:
+    """Get The Histogram Registered As `name` With `labels`, Creating It If It Does Not Exist"""
+    key = _key(name, labels)
+    h = _histograms.get(key)
+    if h is None:
+        h = Histogram(name, description, buckets, labels)
+        _histograms[key] = h
+    return h
+
+
+def gauge(name: str, description: str, read: Callable[[], list[tuple[dict[str, str], float]]]) -> Gauge:
+    g = Gauge(name, description, read)
+    _gauges[name] = g
+    return g
+
+
+def counters() -> list[Counter]:
+    return list(_counters.values())
+
+
+def histograms() -> list[Histogram]:
+    return list(_histograms.values())
+
+
+def gauges() -> list[Gauge]:
+    return list(_gauges.values())
+
+
+def _labels(labels: dict[str, str], **extra: str) -> str:
+    labels = labels | extra
+    if not labels:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for v in labels.values())
+    return "{" + ",".join(f'{k}="{v}"' for k, v in zip(labels, escaped)) + "}"
+
+
+def _header(lines: list[str], seen: set[str], name: str, description: str, kind: str) -> None:
+    if name in seen:
+        return
+    seen.add(name)
+    lines.append(f"# HELP {name} {description}")
+    lines.append(f"# TYPE {name} {kind}")
+
+
+def render_prometheus() -> str:
+    """Every registered metric in the Prometheus text exposition format"""
+    lines: list[str] = []
+    seen: set[str] = set()
+    for c in sorted(counters(), key=lambda m: m.name):
+        _header(lines, seen, c.name, c.description, "counter")
+        lines.append(f"{c.name}{_labels(c.labels)} {c.value}")
+    for h in sorted(histograms(), key=lambda m: m.name):
+        _header(lines, seen, h.name, h.description, "histogram")
+        for bound, count in h.cumulative():
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            lines.append(f"{h.name}_bucket{_labels(h.labels, le=le)} {count}")
+        lines.append(f"{h.name}_sum{_labels(h.labels)} {h.sum}")
+        lines.append(f"{h.name}_count{_labels(h.labels)} {h.count}")
+    for g in sorted(gauges(), key=lambda m: m.name):
+        _header(lines, seen, g.name, g.description, "gauge")
+        for labels, value in g.read():
+            lines.append(f"{g.name}{_labels(labels)} {value}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,86 @@
+"""
+Versioned Schema Migrations
+
+Each migration is a SQL file in `src/migrations` named `<version>_<name>.sql`. Pending migrations are applied in
+version order, each in its own transaction, and recorded in `schema_migration`. Apply them by hand with:
+    python -m utils.migrations
+"""
+import asyncio
+import logging
+import re
+from pathlib import Path
+
+import asyncpg
+from dotenv import load_dotenv
+
+from utils.database import database as db
+
+
+log = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = Path(__file__).parent.parent / "migrations"
+MIGRATION_FILE = re.compile(r"(\d+)_(\w+)\.sql")
+# Held while migrating so two instances starting together do not both apply the same migration
+MIGRATION_LOCK = 0x6D656F77
+
+CREATE_MIGRATION_TABLE = """
+    CREATE TABLE IF NOT EXISTS schema_migration (
+        version integer PRIMARY KEY,
+        name    text NOT NULL,
+        applied timestamptz NOT NULL DEFAULT now()
+    );
+"""
+
+
+def migrations() -> list[tuple[int, str, Path]]:
+    """:returns The version, name and file of every migration, in the order they are applied"""
+    found = []
+    for path in MIGRATIONS_DIR.glob("*.sql"):
+        match = MIGRATION_FILE.fullmatch(path.name)
+        if match is None:
+            raise ValueError(f"Migration File Names Must Be `<version>_<name>.sql`, Got `{path.name}`")
+        found.append((int(match[1]), match[2], path))
+    found.sort()
+    for (a, _, path), (b, _, _) in zip(found, found[1:]):
+        if a == b:
+            raise ValueError(f"More Than One Migration Has Version {a}")
+    return found
+
+
+async def migrate(conn: asyncpg.Connection | None = None) -> list[str]:
+    """
+    Apply every pending migration
+    This runs on its own connection before the pool opens, so no pooled connection caches a statement or type from
+    before the schema changed
+    :return: The names of the migrations that were applied
+    """
+    close = conn is None
+    if conn is None:
+        conn = await asyncpg.connect(**db.connection_args())
+    applied = []
+    try:
+        await conn.execute("SELECT pg_advisory_lock($1);", MIGRATION_LOCK)
+        try:
+            await conn.execute(CREATE_MIGRATION_TABLE)
+            done = {r["version"] for r in await conn.fetch("SELECT version FROM schema_migration;")}
+            for version, name, path in migrations():
+                if version in done:
+                    continue
+                async with conn.transaction():
+                    await conn.execute(path.read_text())
+                    await conn.execute("INSERT INTO schema_migration (version, name) VALUES ($1, $2);", version, name)
+                log.info("Applied migration %04d_%s", version, name)
+                applied.append(name)
+        finally:
+            await conn.execute("SELECT pg_advisory_unlock($1);", MIGRATION_LOCK)
+    finally:
+        if close:
+            await conn.close()
+    return applied
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    names = asyncio.run(migrate())
+    print(f"Applied {len(names)} migrations" + (": " + ", ".join(names) if names else ""))
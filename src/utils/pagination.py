@@ -0,0 +1,64 @@
+from datetime import datetime, timedelta, UTC
+from typing import Self
+
+from discord import ui
+
+
+EPOCH = datetime(1970, 1, 1, tzinfo=UTC)
+
+# A (created, id) keyset position in a list
+Key = tuple[datetime, int]
+
+
+class PageCursor:
+    """
+    Everything Needed To Load A Page, Carried In The `custom_id` Of The Nav Buttons
+
+    `<route>::<owner>:<flag>:<page>:<pages>:<a|b>:<created µs>:<id>` loads the page after (`a`) or before (`b`) the
+    key. `flag` is free for the list to use, like whether completed goals are included. It stays well under the 100
+    character limit of a `custom_id`.
+    """
+
+    __slots__ = ("route", "owner", "flag", "page", "pages", "forward", "key")
+
+    def __init__(self, route: str, owner: int, flag: int, page: int, pages: int, forward: bool, key: Key):
+        self.route = route
+        self.owner = owner
+        self.flag = flag
+        self.page = page
+        self.pages = pages
+        self.forward = forward
+        self.key = key
+
+    @classmethod
+    def parse(cls, custom_id: str) -> Self:
+        route, data = custom_id.split("::", maxsplit=1)
+        owner, flag, page, pages, direction, created, key_id = data.split(":")
+        key = (EPOCH + timedelta(microseconds=int(created)), int(key_id))
+        return cls(route, int(owner), int(flag), int(page), int(pages), direction == "a", key)
+
+    @property
+    def custom_id(self) -> str:
+        # Whole microseconds so the key round trips exactly
+        created = (self.key[0] - EPOCH) // timedelta(microseconds=1)
+        direction = "a" if self.forward else "b"
+        return f"{self.route}::{self.owner}:{self.flag}:{self.page}:{self.pages}:{direction}:{created}:{self.key[1]}"
+
+
+def nav_row(route: str, owner: int, flag: int, page: int, pages: int, first: Key, last: Key,
+            more: bool) -> ui.ActionRow:
+    """
+    The ◀️ Page ▶️ row of a list page
+    :param first: The key of the first item on the page, the page before ends before it
+    :param last: The key of the last item on the page, the page after starts after it
+    :param more: If there is a page after this one
+    """
+    # The page count is from when the list was opened, it grows if more pages turned up since
+    pages = max(pages, page + 1 + more)
+    back = PageCursor(route, owner, flag, page - 1, pages, False, first)
+    forward = PageCursor(route, owner, flag, page + 1, pages, True, last)
+    return ui.ActionRow(
+        ui.Button(emoji="◀️", custom_id=back.custom_id, disabled=page == 0),
+        ui.Button(label=f"{page + 1}/{pages}", disabled=True),
+        ui.Button(emoji="▶️", custom_id=forward.custom_id, disabled=not more),
+    )
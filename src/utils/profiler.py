@@ -0,0 +1,108 @@
+import asyncio
+import json
+import logging
+import re
+from collections import deque
+from collections.abc import Awaitable, Callable
+from datetime import datetime, UTC
+from time import monotonic
+
+
+log = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+_LITERALS = re.compile(r"'(?:[^']|'')*'|(?<![$\w.])\d+(?:\.\d+)?\b")
+
+
+def normalise(sql: str) -> str:
+    """Collapse whitespace and replace literals with `?` so the same query with different literals is grouped"""
+    return _LITERALS.sub("?", _WHITESPACE.sub(" ", sql).strip())
+
+
+class QueryStats:
+    __slots__ = ("name", "sql", "calls", "total", "max", "slow", "plans")
+
+    def __init__(self, name: str, sql: str):
+        self.name = name
+        self.sql = sql
+        self.calls = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.slow = 0
+        # The most recent captured plans, as (captured at, seconds the query took, plan)
+        self.plans: deque[tuple[str, float, str]] = deque(maxlen=3)
+
+    def as_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "sql": self.sql,
+            "calls": self.calls,
+            "total_ms": round(self.total * 1000, 3),
+            "mean_ms": round(self.total / self.calls * 1000, 3) if self.calls else 0.0,
+            "max_ms": round(self.max * 1000, 3),
+            "slow": self.slow,
+            "plans": [{"captured": c, "ms": round(t * 1000, 3), "plan": p} for c, t, p in self.plans],
+        }
+
+
+class QueryProfiler:
+    """
+    Records The Call Count, Total And Max Time Of Every Statement And Captures The Plans Of Slow Ones
+
+    Registered statements are grouped by name and other SQL by its normalised text. A query slower than `threshold`
+    has its plan captured with its real parameters, at most once per `interval` seconds for each statement and with
+    one capture running at a time.
+    """
+
+    def __init__(self, explain: Callable[[str, tuple], Awaitable[str]], threshold: float, interval: float):
+        self._explain = explain
+        self.threshold = threshold
+        self.interval = interval
+        # Key: Statement Name Or Normalised SQL
+        self._stats: dict[str, QueryStats] = {}
+        # Key: Statement Name Or Normalised SQL, Value: monotonic() Of The Last Capture
+        self._last_capture: dict[str, float] = {}
+        self._capturing: asyncio.Task | None = None
+
+    def record(self, sql: str, args: tuple, elapsed: float) -> None:
+        name = getattr(sql, "name", None)
+        key = name or normalise(sql)
+        stats = self._stats.get(key)
+        if stats is None:
+            stats = self._stats[key] = QueryStats(name or "unregistered", normalise(sql))
+        stats.calls += 1
+        stats.total += elapsed
+        if elapsed > stats.max:
+            stats.max = elapsed
+        if elapsed < self.threshold:
+            return
+
+        stats.slow += 1
+        now = monotonic()
+        if (self._capturing is not None and not self._capturing.done()) or \
+                now - self._last_capture.get(key, -self.interval) < self.interval:
+            return
+        self._last_capture[key] = now
+        self._capturing = asyncio.create_task(self._capture(stats, sql, args, elapsed))
+
+    async def _capture(self, stats: QueryStats, sql: str, args: tuple, elapsed: float) -> None:
+        try:
+            plan = await self._explain(sql, args)
+        except Exception:
+            log.exception("Could not capture the plan of `%s`", stats.name)
+            return
+        stats.plans.append((datetime.now(UTC).isoformat(), elapsed, plan))
+        log.warning("Slow query `%s` took %.1fms, plan:\n%s", stats.name, elapsed * 1000, plan)
+
+    def report(self) -> list[dict]:
+        """:returns The stats of every statement, the ones that took the most time in total first"""
+        return [s.as_dict() for s in sorted(self._stats.values(), key=lambda s: -s.total)]
+
+    def dump(self, path: str) -> None:
+        with open(path, "w") as f:
+            json.dump(self.report(), f, indent=2)
+        log.info("Wrote the stats of %d statements to %s", len(self._stats), path)
+
+    def reset(self) -> None:
+        self._stats.clear()
+        self._last_capture.clear()
@@ -0,0 +1,59 @@
+from collections.abc import Awaitable, Callable
+from time import perf_counter
+
+from discord import Interaction
+
+from utils.metrics import Counter, Histogram, counter, histogram
+
+
+Handler = Callable[[Interaction], Awaitable[None]]
+
+
+class Route:
+    __slots__ = ("handler", "latency", "errors")
+
+    def __init__(self, name: str, handler: Handler):
+        self.handler = handler
+        self.latency: Histogram = histogram("interaction_seconds", "Interaction handler latency",
+                                            labels={"handler": name})
+        self.errors: Counter = counter("interaction_errors_total", "Interaction handlers that raised",
+                                       labels={"handler": name})
+
+
+class InteractionRouter:
+    """
+    Dispatches Component Interactions To Their Handler With One Lookup
+
+    A `custom_id` is routed by the part before `::`, so `view_goal::12` and `complete_goal` are routed to the
+    handlers added as `view_goal` and `complete_goal`.
+    """
+
+    def __init__(self) -> None:
+        self._routes: dict[str, Route] = {}
+
+    def add(self, name: str, handler: Handler) -> None:
+        if name in self._routes:
+            raise ValueError(f"An Interaction Handler Is Already Registered For `{name}`")
+        self._routes[name] = Route(name, handler)
+
+    async def on_interaction(self, interaction: Interaction) -> None:
+        if interaction.custom_id is None:
+            return
+        route = self._routes.get(interaction.custom_id.split("::", maxsplit=1)[0])
+        if route is None:
+            return
+
+        start = perf_counter()
+        try:
+            await route.handler(interaction)
+        except Exception:
+            route.errors.inc()
+            raise
+        finally:
+            route.latency.observe(perf_counter() - start)
+
+    def stats(self) -> dict[str, dict[str, float]]:
+        return {name: route.latency.stats() | {"errors": route.errors.value} for name, route in self._routes.items()}
+
+
+router = InteractionRouter()